@@ -4,3 +4,6 @@ ATTR_STATUS_SUSPENDED = "suspended"
 ATTR_STATUS_DELETED = "deleted"
 ATTR_STATUS_TRANSFERRED = "transferred"
 
+
+# Set by nimda on every write, for refreshing local snapshots incrementally
+ATTR_LAST_MODIFIED = "last_modified"
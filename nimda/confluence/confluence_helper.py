@@ -5,40 +5,58 @@ See also https://docs.atlassian.com/atlassian-confluence/REST/latest/
 """
 from __future__ import print_function
 import json
-import requests
 
 from nimda.confluence import service_defs as DEFS
+from nimda.utils import create_http_session, imap_in_thread_pool, DEFAULT_POOL_SIZE
 
 
 # Define constants
 HEADERS = {'content-type': 'application/json'}
 
+# Default number of results per page of a GET request
+DEFAULT_PAGE_SIZE = 200
+
+# Default max number of concurrent requests (1 for sequential requests)
+DEFAULT_CONCURRENCY = 1
+
 
 class ConfluenceHelper(object):
 
-    def __init__(self, username, userpass, server, logger):
+    def __init__(self, username, userpass, server, logger, pool_size=DEFAULT_POOL_SIZE,
+                 page_size=DEFAULT_PAGE_SIZE, concurrency=DEFAULT_CONCURRENCY):
         self.username = username
         self.userpass = userpass
         self.server = server
         self.logger = logger
+        self.page_size = page_size
+        self.concurrency = concurrency
+
+        # Connections are kept alive and reused by all requests of this helper
+        self.session = create_http_session((self.username, self.userpass), HEADERS, pool_size)
 
     def groups(self):
         """Return a `list` containing names of groups
         """
         request_data = DEFS.get_groups(self.server)
-        return [g['name'] for g in self.get_request(request_data.service_url, request_data.data)]
+        return [g['name'] for g in self.get_all_results(request_data.service_url, request_data.data)]
 
     def group_members(self, groupname):
         """Return a `list` of members of a group (in `dict` with keys `username`, `displayName` and `userKey`)
         """
+        return list(self.iter_group_members(groupname))
+
+    def iter_group_members(self, groupname):
+        """Yield members of a group (in `dict` with keys `username`, `displayName` and `userKey`),
+           reading one page at a time
+        """
         request_data = DEFS.get_group_members(self.server, groupname)
-        return self.get_request(request_data.service_url, request_data.data)
+        return self.get_all_results(request_data.service_url, request_data.data)
 
     def member_groups(self, username):
         """Return a `list` of group names of a member
         """
         request_data = DEFS.get_member_groups(self.server, username)
-        return [g['name'] for g in self.get_request(request_data.service_url, request_data.data)]
+        return [g['name'] for g in self.get_all_results(request_data.service_url, request_data.data)]
 
     def remove_member_from_group(self, username, groupname):
         """Return `True` if the member can be removed from the group; `False` otherwise
@@ -63,11 +81,16 @@ class ConfluenceHelper(object):
         """
         err_cnt = 0
 
-        # 1. Remove user of username from all groups
-        for groupname in self.member_groups(username):
+        # 1. Remove user of username from all groups (up to `concurrency` groups at a time)
+        def remove_from_group(groupname):
             self.logger.info("Removing {} from group {} ...".format(username, groupname))
             if self.remove_member_from_group(username, groupname) is not True:
                 self.logger.error("Failed to remove user {} from group {}".format(username, groupname))
+                return False
+            return True
+
+        for removed in imap_in_thread_pool(remove_from_group, self.member_groups(username), self.concurrency):
+            if removed is not True:
                 err_cnt += 1
 
         # 2. Revoking application access
@@ -84,48 +107,65 @@ class ConfluenceHelper(object):
         return err_cnt == 0
 
     def members_in_all_groups(self):
-        """Return members in all groups
+        """Return members in all groups.
+           Members of up to `concurrency` groups are retrieved at a time, and merged in the order of the groups.
         """
+        def group_members(group_name):
+            self.logger.info('Checking group {} ...'.format(group_name))
+            if self.concurrency <= 1:
+                return group_name, self.iter_group_members(group_name)
+            return group_name, self.group_members(group_name)
+
         users = {}
         group_names = self.groups()
-        for group_name in group_names:
-            self.logger.info('Checking group {} ...'.format(group_name))
-            for user in self.group_members(group_name):
-                if user['username'] in users.keys():
+        for group_name, members in imap_in_thread_pool(group_members, group_names, self.concurrency):
+            for user in members:
+                if user['username'] in users:
                     users[user['username']]['groups'].append(group_name)
                 else:
                     users[user['username']] = {'displayName': user['displayName'], 'groups': [group_name]}
         return users
 
+    def get_pages(self, service_url, service_data):
+        """Yield the results of each page of a GET request, from `start` 0 with `page_size`
+           results per page, until there is no `next` page
+        """
+        params = dict(service_data)
+        params['limit'] = self.page_size
+        params['start'] = 0
+        while True:
+            response = self.session.get(service_url, params=params)
+            if response.ok is False:
+                self.logger.error("{}: {}".format(response.status_code, response.reason))
+                return
+            ret = response.json()
+            yield ret['results']
+            if not ret['results'] or 'next' not in ret.get('_links', {}):
+                return
+            params['start'] += len(ret['results'])
+
+    def get_all_results(self, service_url, service_data):
+        """Yield all results of a GET request, reading one page at a time
+        """
+        for results in self.get_pages(service_url, service_data):
+            for result in results:
+                yield result
+
     def get_request(self, service_url, service_data):
-        response = requests.get(
-            service_url,
-            params=service_data,
-            auth=(self.username, self.userpass)
-        )
+        response = self.session.get(service_url, params=service_data)
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
             return []
         return response.json()['results']
 
     def post_request(self, service_url, service_data):
-        response = requests.post(
-            service_url,
-            params=service_data,
-            headers=HEADERS,
-            auth=(self.username, self.userpass)
-        )
+        response = self.session.post(service_url, params=service_data)
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
         return response.ok
 
     def delete_request(self, service_url, service_data):
-        response = requests.delete(
-            service_url,
-            params=service_data,
-            headers=HEADERS,
-            auth=(self.username, self.userpass)
-        )
+        response = self.session.delete(service_url, params=service_data)
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
         return response.ok
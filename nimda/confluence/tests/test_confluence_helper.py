@@ -1,5 +1,6 @@
 import logging
 import requests_mock
+from mock import Mock
 
 from nimda.confluence.confluence_helper import ConfluenceHelper
 import nimda.confluence.service_defs as DEFS
@@ -215,6 +216,24 @@ def test_confluence_helper_remove_all_access():
         assert helper.remove_all_access("user1") is False
 
 
+def test_confluence_helper_remove_all_access_concurrently():
+    """Test ConfluenceHelper remove_all_access removes user from groups concurrently and counts each failure
+    """
+    helper = ConfluenceHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, concurrency=4)
+    calls = []
+    helper.member_groups = Mock(return_value=["group{}".format(i) for i in range(10)])
+    helper.remove_member_from_group = Mock(side_effect=lambda u, g: calls.append(g) or g != "group3")
+    helper.revoke_application_access = Mock(side_effect=lambda u: calls.append("revoke") or True)
+    helper.deactivate_user = Mock(side_effect=lambda u: calls.append("deactivate") or True)
+
+    assert helper.remove_all_access("user1") is False
+    assert helper.remove_member_from_group.call_count == 10
+    assert calls[-2:] == ["revoke", "deactivate"]
+
+    helper.remove_member_from_group = Mock(return_value=True)
+    assert helper.remove_all_access("user1") is True
+
+
 def test_confluence_helper_members_in_all_groups():
     """Test ConfluenceHelper members_in_all_groups
     """
@@ -258,3 +277,52 @@ def test_confluence_helper_members_in_all_groups():
         assert len(ret["user1"]["groups"]) == 2 and "group1" in ret["user1"]["groups"] and "group2" in ret["user1"]["groups"]
         assert len(ret["user2"]["groups"]) == 1 and "group1" in ret["user2"]["groups"]
         assert len(ret["user3"]["groups"]) == 1 and "group2" in ret["user3"]["groups"]
+
+        # Members retrieved concurrently are merged in the same order
+        helper = ConfluenceHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, concurrency=4)
+        assert helper.members_in_all_groups() == ret
+        assert ret["user1"]["groups"] == ["group1", "group2"]
+
+
+def test_confluence_helper_session():
+    """Test ConfluenceHelper sends all requests with the auth of its session
+    """
+    with requests_mock.mock() as mock_adapter:
+        helper = ConfluenceHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, pool_size=5)
+
+        mock_adapter.get(DEFS.get_groups(TEST_SERVER).service_url,
+            json={"results": [{"name": "group1", "type": "group"}], "size": 1},
+            status_code=200
+        )
+        mock_adapter.delete(DEFS.delete_app_access(TEST_SERVER, "user1").service_url, status_code=204)
+
+        assert helper.groups() == ["group1"]
+        assert helper.revoke_application_access("user1") is True
+        assert mock_adapter.call_count == 2
+        for request in mock_adapter.request_history:
+            assert request.headers['Authorization'].startswith('Basic ')
+
+
+def test_confluence_helper_group_members_pages():
+    """Test ConfluenceHelper group_members reads all pages
+    """
+    with requests_mock.mock() as mock_adapter:
+        helper = ConfluenceHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, page_size=2)
+
+        mock_adapter.get(DEFS.get_group_members(TEST_SERVER, "group1").service_url, [
+            {"status_code": 200, "json": {
+                "results": [{"username": "user1", "displayName": "User 1"}, {"username": "user2", "displayName": "User 2"}],
+                "start": 0, "limit": 2, "size": 2,
+                "_links": {"next": "/rest/api/group/group1/member?limit=2&start=2"}
+            }},
+            {"status_code": 200, "json": {
+                "results": [{"username": "user3", "displayName": "User 3"}],
+                "start": 2, "limit": 2, "size": 1,
+                "_links": {}
+            }},
+        ])
+
+        ret = helper.group_members("group1")
+        assert [u["username"] for u in ret] == ["user1", "user2", "user3"]
+        assert [r.qs["start"] for r in mock_adapter.request_history] == [["0"], ["2"]]
+        assert all(r.qs["limit"] == ["2"] for r in mock_adapter.request_history)
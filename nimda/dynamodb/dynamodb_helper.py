@@ -1,9 +1,30 @@
+from collections import OrderedDict
+from functools import reduce
+import time
+
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import BotoCoreError, ClientError
+
+from nimda.storage_abc import StorageABC
+from nimda.utils import imap_in_thread_pool
 
 
 DEFAULT_REGION = 'ap-southeast-2'
 
+# Max number of threads scanning segments of a table at the same time
+MAX_SCAN_WORKERS = 16
+
+# Max number of items in a BatchWriteItem request
+BATCH_WRITE_SIZE = 25
+
+# Max number of keys in a BatchGetItem request
+BATCH_GET_SIZE = 100
+
+# Retries of unprocessed items of a batch request, with exponential backoff starting from the delay (seconds)
+BATCH_MAX_RETRIES = 5
+BATCH_RETRY_DELAY = 0.1
+
 
 def init_session(profile_name):
     """Return an aws session for the given aws profile
@@ -11,9 +32,10 @@ def init_session(profile_name):
     return boto3.session.Session(profile_name=profile_name)
 
 
-class DynamoDBHelper(object):
+class DynamoDBHelper(StorageABC):
     def __init__(self, profile_name, users_table_name, users_table_key, logger):
         self.logger = logger
+        self.profile_name = profile_name
         self.client = self.create_client(profile_name=profile_name)
         self.table = self.client.Table(users_table_name)
         self.table_key = users_table_key
@@ -26,6 +48,16 @@ class DynamoDBHelper(object):
             return boto3.resource('dynamodb', region_name=region)
         return init_session(profile_name).resource('dynamodb', region_name=region)
 
+    @staticmethod
+    def projection(attributes):
+        """Return request parameters for reading only the given `attributes` of items
+        """
+        names = ['#p{}'.format(i) for i in range(len(attributes))]
+        return {
+            'ProjectionExpression': ', '.join(names),
+            'ExpressionAttributeNames': dict(zip(names, attributes)),
+        }
+
     def user_exists(self, user_main_account):
         """Return True if `user_main_account` does exist in the database; False otherwise.
         """
@@ -34,6 +66,52 @@ class DynamoDBHelper(object):
         )
         return response['Count']>0
 
+    def get_item(self, key, attributes=None):
+        """Return the item of `key`, or None if not found. Only the given `attributes`
+           are returned if specified.
+        """
+        kwargs = {'Key': {self.table_key: key}}
+        if attributes:
+            kwargs.update(self.projection(attributes))
+        return self.table.get_item(**kwargs).get('Item')
+
+    def batch_get_items(self, keys, attributes=None):
+        """Return ({key: item} of the items found, [keys not found]) with BatchGetItem requests
+           of up to 100 keys. Only the given `attributes` are returned if specified.
+           An error is raised if any of the keys cannot be looked up, so that no existing item
+           is reported as not found.
+        """
+        # A batch cannot get the same key twice
+        keys = list(OrderedDict.fromkeys(keys))
+
+        found = {}
+        for i in range(0, len(keys), BATCH_GET_SIZE):
+            found.update(self._batch_get(keys[i:i + BATCH_GET_SIZE], attributes))
+        return found, [k for k in keys if k not in found]
+
+    def _batch_get(self, keys, attributes):
+        """Get items of `keys` in one BatchGetItem request, retrying unprocessed keys with backoff.
+           Return {key: item} of the items found; raise `RuntimeError` if some keys are still
+           unprocessed after the retries.
+        """
+        get_request = {'Keys': [{self.table_key: k} for k in keys]}
+        if attributes:
+            get_request.update(self.projection(attributes))
+
+        items = {}
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            if attempt > 0:
+                time.sleep(BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+            ret = self.table.meta.client.batch_get_item(RequestItems={self.table.name: get_request})
+            for item in ret.get('Responses', {}).get(self.table.name, []):
+                items[item[self.table_key]] = item
+            get_request = ret.get('UnprocessedKeys', {}).get(self.table.name)
+            if not get_request:
+                return items
+
+        raise RuntimeError("Failed to get items of {} after {} retries".format(
+            ", ".join(str(k[self.table_key]) for k in get_request['Keys']), BATCH_MAX_RETRIES))
+
     def put_item(self, input_dict):
         """Put item (add new or override existing item) into the database
         """
@@ -41,15 +119,157 @@ class DynamoDBHelper(object):
             ret = self.table.put_item(Item=input_dict)
             self.logger.debug(ret)
         except Exception as e:
-            self.logger(e)
+            self.logger.error(e)
             return False
         return True
 
-    def all_users(self):
-        """Return list of user accounts (dict):
+    def update_item(self, key, set_dict, remove_attrs=None, expected_dict=None):
+        """Update only the given attributes of the item of `key` in a single request: set attributes
+           in `set_dict`, remove attributes in `remove_attrs`, on condition that the current values
+           of the item are the ones in `expected_dict`. Return True if succeeded; False otherwise.
+           The request is sent by the low level client, which (unlike the table resource) is thread safe.
         """
+        names, values = {}, {}
+        set_exprs, remove_exprs, condition_exprs = [], [], []
+        for i, (attr, value) in enumerate(set_dict.items()):
+            names['#s{}'.format(i)] = attr
+            values[':s{}'.format(i)] = value
+            set_exprs.append('#s{0} = :s{0}'.format(i))
+        for i, attr in enumerate(remove_attrs or []):
+            names['#r{}'.format(i)] = attr
+            remove_exprs.append('#r{}'.format(i))
+        for i, (attr, value) in enumerate((expected_dict or {}).items()):
+            names['#c{}'.format(i)] = attr
+            values[':c{}'.format(i)] = value
+            condition_exprs.append('#c{0} = :c{0}'.format(i))
+
+        update_expr = ' '.join(
+            '{} {}'.format(action, ', '.join(exprs)) for action, exprs in [('SET', set_exprs), ('REMOVE', remove_exprs)]
+            if exprs
+        )
+        kwargs = {
+            'TableName': self.table.name,
+            'Key': {self.table_key: key},
+            'UpdateExpression': update_expr,
+            'ExpressionAttributeNames': names,
+        }
+        if values:
+            kwargs['ExpressionAttributeValues'] = values
+        if condition_exprs:
+            kwargs['ConditionExpression'] = ' AND '.join(condition_exprs)
+
         try:
-            return self.table.scan()['Items']
-        except Exception as e:
+            ret = self.table.meta.client.update_item(**kwargs)
+            self.logger.debug(ret)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                self.logger.error("{} has been changed by others (expected {})".format(key, expected_dict))
+            else:
+                self.logger.error(e)
+            return False
+        except BotoCoreError as e:
             self.logger.error(e)
-        return []
+            return False
+        return True
+
+    def batch_put_items(self, input_dicts):
+        """Put items (add new or override existing items) into the database with BatchWriteItem
+           requests of up to 25 items. Return a `dict` of {key: True if succeeded; False otherwise}
+        """
+        # A batch cannot put the same key twice, so only the last item of a key is written
+        items = OrderedDict((item[self.table_key], item) for item in input_dicts)
+        keys = list(items.keys())
+
+        results = {}
+        for i in range(0, len(keys), BATCH_WRITE_SIZE):
+            chunk = keys[i:i + BATCH_WRITE_SIZE]
+            unprocessed_keys = self._batch_write([items[k] for k in chunk])
+            for k in chunk:
+                results[k] = k not in unprocessed_keys
+        return results
+
+    def _batch_write(self, items):
+        """Write `items` in one BatchWriteItem request, retrying unprocessed items with backoff.
+           Return the keys of the items which could not be written.
+        """
+        write_requests = [{'PutRequest': {'Item': item}} for item in items]
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            if attempt > 0:
+                time.sleep(BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                ret = self.table.meta.client.batch_write_item(RequestItems={self.table.name: write_requests})
+                self.logger.debug(ret)
+            except Exception as e:
+                self.logger.error(e)
+                break
+            write_requests = ret.get('UnprocessedItems', {}).get(self.table.name, [])
+            if not write_requests:
+                break
+        return set(r['PutRequest']['Item'][self.table_key] for r in write_requests)
+
+    def segment_table(self):
+        """Return a new table resource for scanning a segment in its own thread,
+           as boto3 resources are not thread safe
+        """
+        return init_session(self.profile_name).resource('dynamodb', region_name=DEFAULT_REGION).Table(self.table.name)
+
+    def scan_pages(self, page_size=None, table=None, **scan_kwargs):
+        """Yield the items (list of dict) of each page of a table scan, following
+           `LastEvaluatedKey` until the whole table has been read.
+           `page_size` limits the number of items evaluated per page.
+        """
+        if table is None:
+            table = self.table
+        if page_size is not None:
+            scan_kwargs['Limit'] = page_size
+
+        while True:
+            response = table.scan(**scan_kwargs)
+            yield response['Items']
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def parallel_scan_pages(self, total_segments, page_size=None, max_workers=MAX_SCAN_WORKERS, **scan_kwargs):
+        """Yield the items (list of dict) of each segment of a parallel scan, as soon as
+           the scan of the segment completes
+        """
+        def scan_segment(segment):
+            items = []
+            for page in self.scan_pages(page_size=page_size, table=self.segment_table(),
+                                        Segment=segment, TotalSegments=total_segments, **scan_kwargs):
+                items.extend(page)
+            return items
+
+        workers = min(total_segments, max_workers)
+        for items in imap_in_thread_pool(scan_segment, range(total_segments), workers, ordered=False):
+            yield items
+
+    def all_users(self, page_size=None, total_segments=1, min_values=None, attributes=None):
+        """Yield user accounts (dict) page by page, as they are read from the database.
+           The table is scanned in `total_segments` parallel segments if more than 1.
+           If `min_values` (dict) is given, only the items having attributes not less
+           than these values are returned.
+           If `attributes` (list) is given, only these attributes of the items are returned.
+        An error of the scan is raised (after the items read so far), as the users read would not be
+        the whole table.
+        """
+        scan_kwargs = {}
+        if attributes:
+            scan_kwargs.update(self.projection(attributes))
+        if min_values:
+            scan_kwargs['FilterExpression'] = reduce(
+                lambda x, y: x & y, [Attr(attr).gte(value) for attr, value in min_values.items()])
+
+        if total_segments > 1:
+            pages = self.parallel_scan_pages(total_segments, page_size=page_size, **scan_kwargs)
+        else:
+            pages = self.scan_pages(page_size=page_size, **scan_kwargs)
+
+        try:
+            for items in pages:
+                for item in items:
+                    yield item
+        except Exception as e:
+            self.logger.error("Scan of table {} not completed: {}".format(self.table.name, e))
+            raise
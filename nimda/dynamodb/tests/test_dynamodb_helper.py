@@ -1,4 +1,7 @@
 import logging
+import py.test
+from botocore.exceptions import ClientError, EndpointConnectionError
+import mock
 from mock import Mock
 from nimda.dynamodb.dynamodb_helper import DynamoDBHelper
 
@@ -49,3 +52,220 @@ def test_remove_all_team_repo_access():
     assert helper.put_item(input_dict={"gmail": "hello", "status": "active"}) is True
     assert helper.user_exists(user_main_account="hello") is True
     assert helper.all_users()
+
+
+def test_all_users_follows_last_evaluated_key():
+    """Test DynamoDBHelper all_users reads every page of the scan
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    helper.table.scan = Mock(side_effect=[
+        {'Items': [{'gmail': 'user1'}, {'gmail': 'user2'}], 'LastEvaluatedKey': {'gmail': 'user2'}},
+        {'Items': [{'gmail': 'user3'}]},
+    ])
+
+    ret = list(helper.all_users(page_size=2))
+    assert [u['gmail'] for u in ret] == ['user1', 'user2', 'user3']
+    assert helper.table.scan.call_count == 2
+    helper.table.scan.assert_called_with(Limit=2, ExclusiveStartKey={'gmail': 'user2'})
+
+
+def test_all_users_raises_incomplete_scan():
+    """Test DynamoDBHelper all_users raises the error of a page, rather than returning part of the table
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    error = ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Throttled'}}, 'Scan')
+    helper.table.scan = Mock(side_effect=[
+        {'Items': [{'gmail': 'user1'}, {'gmail': 'user2'}], 'LastEvaluatedKey': {'gmail': 'user2'}},
+        error,
+    ])
+
+    read = []
+    with py.test.raises(ClientError):
+        for user in helper.all_users(page_size=2):
+            read.append(user['gmail'])
+    assert read == ['user1', 'user2']
+
+
+def test_all_users_parallel_scan():
+    """Test DynamoDBHelper all_users merges the items of all scan segments
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    def segment_table():
+        table = Mock()
+        table.scan = Mock(side_effect=lambda **kwargs: {
+            'Items': [{'gmail': 'user{}'.format(kwargs['Segment'])}]
+        })
+        return table
+    helper.segment_table = segment_table
+
+    ret = list(helper.all_users(total_segments=3))
+    assert sorted(u['gmail'] for u in ret) == ['user0', 'user1', 'user2']
+
+
+def test_batch_put_items():
+    """Test DynamoDBHelper batch_put_items chunks items and retries unprocessed items
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    items = [{'gmail': 'user{}'.format(i), 'status': 'suspended'} for i in range(30)]
+    unprocessed = {'sample_users': [{'PutRequest': {'Item': items[3]}}]}
+
+    helper.table.meta.client.batch_write_item = Mock(side_effect=[
+        {'UnprocessedItems': unprocessed},  # 1st chunk of 25 items
+        {'UnprocessedItems': {}},           # retry of the 1st chunk
+        {'UnprocessedItems': {}},           # 2nd chunk of 5 items
+    ])
+    ret = helper.batch_put_items(items)
+    assert len(ret) == 30 and all(ret.values())
+
+    calls = helper.table.meta.client.batch_write_item.call_args_list
+    assert len(calls[0][1]['RequestItems']['sample_users']) == 25
+    assert calls[1][1]['RequestItems'] == unprocessed
+    assert len(calls[2][1]['RequestItems']['sample_users']) == 5
+
+    # Failed requests should be reported per item
+    helper.table.meta.client.batch_write_item = Mock(side_effect=Exception("Failed"))
+    ret = helper.batch_put_items(items[:2])
+    assert ret == {'user0': False, 'user1': False}
+
+
+def test_update_item():
+    """Test DynamoDBHelper update_item sets and removes attributes on condition
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    helper.table.meta.client.update_item = Mock(return_value=SAMPLE_UPDATE_STATUS_OK)
+    assert helper.update_item(
+        "hello", {"status": "suspended"}, ["jira", "jenkins"], {"status": "active"}) is True
+    helper.table.meta.client.update_item.assert_called_with(
+        TableName="sample_users",
+        Key={"gmail": "hello"},
+        UpdateExpression="SET #s0 = :s0 REMOVE #r0, #r1",
+        ExpressionAttributeNames={"#s0": "status", "#r0": "jira", "#r1": "jenkins", "#c0": "status"},
+        ExpressionAttributeValues={":s0": "suspended", ":c0": "active"},
+        ConditionExpression="#c0 = :c0"
+    )
+
+    # Status has been changed by others
+    helper.table.meta.client.update_item = Mock(side_effect=ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'The conditional request failed'}},
+        'UpdateItem'
+    ))
+    assert helper.update_item("hello", {"status": "suspended"}, ["jira"], {"status": "active"}) is False
+
+    # Other errors are reported as failed too
+    helper.table.meta.client.update_item = Mock(side_effect=EndpointConnectionError(endpoint_url='https://example.com'))
+    assert helper.update_item("hello", {"status": "suspended"}, ["jira"], {"status": "active"}) is False
+
+
+def test_all_users_projection():
+    """Test DynamoDBHelper all_users reads only the given attributes
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    helper.table.scan = Mock(return_value={'Items': [{'gmail': 'user1', 'status': 'active'}]})
+    assert len(list(helper.all_users(attributes=['gmail', 'status']))) == 1
+    helper.table.scan.assert_called_with(
+        ProjectionExpression='#p0, #p1',
+        ExpressionAttributeNames={'#p0': 'gmail', '#p1': 'status'}
+    )
+
+
+def test_batch_get_items():
+    """Test DynamoDBHelper batch_get_items chunks keys and retries unprocessed keys
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    keys = ['user{}'.format(i) for i in range(150)] + ['user0']
+    unprocessed = {'sample_users': {'Keys': [{'gmail': 'user3'}]}}
+
+    helper.table.meta.client.batch_get_item = Mock(side_effect=[
+        # 1st chunk of 100 keys, where user3 is not processed
+        {'Responses': {'sample_users': [{'gmail': k} for k in keys[:100] if k != 'user3']},
+         'UnprocessedKeys': unprocessed},
+        # retry of the 1st chunk
+        {'Responses': {'sample_users': [{'gmail': 'user3'}]}, 'UnprocessedKeys': {}},
+        # 2nd chunk of 50 keys, where user149 does not exist
+        {'Responses': {'sample_users': [{'gmail': k} for k in keys[100:149]]}, 'UnprocessedKeys': {}},
+    ])
+    found, missing = helper.batch_get_items(keys)
+    assert len(found) == 149 and 'user3' in found
+    assert missing == ['user149']
+
+    calls = helper.table.meta.client.batch_get_item.call_args_list
+    assert len(calls[0][1]['RequestItems']['sample_users']['Keys']) == 100
+    assert calls[1][1]['RequestItems'] == unprocessed
+    assert len(calls[2][1]['RequestItems']['sample_users']['Keys']) == 50
+
+    # Keys still unprocessed after the retries are not reported as not found
+    helper.table.meta.client.batch_get_item = Mock(return_value={
+        'Responses': {'sample_users': [{'gmail': 'user1'}]}, 'UnprocessedKeys': unprocessed})
+    with mock.patch('nimda.dynamodb.dynamodb_helper.time.sleep'):
+        with py.test.raises(RuntimeError):
+            helper.batch_get_items(['user1', 'user3'])
+
+    # Nor are keys of a failed request
+    helper.table.meta.client.batch_get_item = Mock(side_effect=ClientError(
+        {'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Throttled'}}, 'BatchGetItem'))
+    with py.test.raises(ClientError):
+        helper.batch_get_items(['user1', 'user3'])
+
+
+def test_get_item():
+    """Test DynamoDBHelper get_item
+    """
+    helper = DynamoDBHelper(
+        profile_name=None,
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger
+    )
+
+    helper.table.get_item = Mock(return_value={'Item': {'gmail': 'user1', 'status': 'active'}})
+    assert helper.get_item('user1', attributes=['status']) == {'gmail': 'user1', 'status': 'active'}
+    helper.table.get_item.assert_called_with(
+        Key={'gmail': 'user1'},
+        ProjectionExpression='#p0',
+        ExpressionAttributeNames={'#p0': 'status'}
+    )
+
+    helper.table.get_item = Mock(return_value={})
+    assert helper.get_item('user2') is None
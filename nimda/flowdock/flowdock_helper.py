@@ -5,30 +5,50 @@ https://www.flowdock.com/api
 """
 from __future__ import print_function
 import json
-import requests
 
 from nimda.flowdock import service_defs as DEFS
+from nimda.utils import create_http_session, iter_json_array, DEFAULT_POOL_SIZE
 
 
 # Define constants
 HEADERS = {'content-type': 'application/json'}
 
+# Number of bytes read at a time from a streamed response
+CHUNK_SIZE = 64 * 1024
+
 
 class FlowdockHelper(object):
 
-    def __init__(self, email, userpass, organisation, server, logger):
+    def __init__(self, email, userpass, organisation, server, logger, pool_size=DEFAULT_POOL_SIZE):
         self.email = email
         self.userpass = userpass
         self.organisation = organisation
         self.server = server
         self.logger = logger
 
-    def users(self, email_list):
-        """Return a `list` of user ({'email', 'id', 'avatar', 'name', 'website'})
+        # Connections are kept alive and reused by all requests of this helper
+        self.session = create_http_session((self.email, self.userpass), HEADERS, pool_size)
+
+    def users(self, emails):
+        """Return a `list` of user ({'email', 'id', 'avatar', 'name', 'website'}) of the given `emails` (any iterable)
+        """
+        emails = set(emails)
+        return [v for v in self.iter_users() if v['email'] in emails]
+
+    def iter_users(self):
+        """Yield each user ({'email', 'id', 'avatar', 'name', 'website'}) of all users, parsed as the
+           response is read
         """
         request_data = DEFS.get_users(self.server)
-        ret = self.get_request(request_data.service_url, request_data.data)
-        return [v for v in ret if v['email'] in email_list]
+        response = self.session.get(request_data.service_url, params=request_data.data, stream=True)
+        try:
+            if response.ok is False:
+                self.logger.error("{}: {}".format(response.status_code, response.reason))
+                return
+            for user in iter_json_array(response.iter_content(chunk_size=CHUNK_SIZE)):
+                yield user
+        finally:
+            response.close()
 
     def remove_user_from_organisation(self, user_id):
         """Return `True` if the user with the given `user_id` can be removed
@@ -38,34 +58,20 @@ class FlowdockHelper(object):
         return self.delete_request(request_data.service_url, request_data.data)
 
     def get_request(self, service_url, service_data):
-        response = requests.get(
-            service_url,
-            params=service_data,
-            auth=(self.email, self.userpass)
-        )
+        response = self.session.get(service_url, params=service_data)
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
             return []
         return response.json()
 
     def post_request(self, service_url, service_data):
-        response = requests.post(
-            service_url,
-            params=service_data,
-            headers=HEADERS,
-            auth=(self.email, self.userpass)
-        )
+        response = self.session.post(service_url, params=service_data)
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
         return response.ok
 
     def delete_request(self, service_url, service_data):
-        response = requests.delete(
-            service_url,
-            params=service_data,
-            headers=HEADERS,
-            auth=(self.email, self.userpass)
-        )
+        response = self.session.delete(service_url, params=service_data)
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
         return response.ok
@@ -38,6 +38,9 @@ def test_flowdock_users():
         assert ret[0]['email'] == "user2@example.com"
         assert ret[1]['email'] == "user3@example.com"
 
+        # Any iterable of email addresses can be given
+        assert helper.users(e for e in sample_email_list) == ret
+
         # Mock get_users return for 401
         mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url,
             status_code=401
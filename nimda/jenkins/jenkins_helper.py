@@ -3,103 +3,308 @@ Jenkins helper implements a client to interact the Jenkins REST API
 for user management.
 """
 from __future__ import print_function
+from collections import OrderedDict
+import json
 import requests
+import threading
+import time
 
 from nimda.jenkins import service_defs as DEFS
+from nimda.utils import create_http_session, imap_in_thread_pool, DEFAULT_POOL_SIZE
 
 
 # Define constants
 HEADERS = {'content-type': 'application/json'}
+FORM_HEADERS = {'content-type': 'application/x-www-form-urlencoded'}
+
+# A user having a property of this class is active (not deleted)
+ACTIVE_USER_PROPERTY_CLASS = "hudson.security.HudsonPrivateSecurityRealm$Details"
+
+# Default max number of concurrent requests (1 for sequential requests)
+DEFAULT_CONCURRENCY = 1
+
+# Default max number of seconds to keep polling the (asynchronously loaded) list of all users
+DEFAULT_PEOPLE_DEADLINE = 60
 
 
 class JenkinsHelper(object):
 
-    def __init__(self, username, userpass, server, logger):
+    # Seconds to wait before polling the list of all users again, doubled after each poll up to the max
+    POLL_DELAY = 0.5
+    POLL_MAX_DELAY = 8
+    # The list of all users is considered loaded when this number of consecutive polls find no new users,
+    # and at least this number of seconds have passed since the first poll
+    POLL_STABLE_COUNT = 3
+    POLL_MIN_SECONDS = 2
+
+    # Max number of times to check if a user has been deactivated when the deletion has not been confirmed
+    DEACTIVATION_MAX_CHECKS = 3
+
+    def __init__(self, username, userpass, server, logger, pool_size=DEFAULT_POOL_SIZE,
+                 concurrency=DEFAULT_CONCURRENCY, timeout=None, people_deadline=DEFAULT_PEOPLE_DEADLINE,
+                 script_console=False):
         self.username = username
         self.userpass = userpass
         self.server = server
         self.logger = logger
+        self.concurrency = concurrency
+        # Seconds to wait for the server to respond to a request (None to wait forever)
+        self.timeout = timeout
+        self.people_deadline = people_deadline
+        # Whether statuses of all users are retrieved by one script run in the script console (admin only)
+        self.script_console = script_console
+        self._script_users_statuses = None
+        # The script is run once for all users: its failure is remembered, so that the details of each
+        # user are retrieved instead
+        self._script_failed = False
+        self._script_lock = threading.Lock()
+        # Ids of users whose status could not be determined by the last `active_users`
+        self.unknown_users_ids = []
+
+        # Connections are kept alive and reused by all requests of this helper
+        self.session = create_http_session((self.username, self.userpass), HEADERS, pool_size)
+        self._crumb_requested = False
+        self._crumb_lock = threading.Lock()
 
     def active_users(self, users_ids=None):
-        """Return a `list` containing active users' ids
+        """Return a `list` containing active users' ids.
+           Users whose status cannot be determined (e.g. the request of their details timed out) are not
+           returned, but logged and kept in `unknown_users_ids`.
         """
-        jenkins_users_ids = users_ids
+        if users_ids is None and self.script_console is True:
+            # Retrieve statuses of all Jenkins users in one request
+            users_statuses = self.script_users_statuses()
+            if users_statuses is not None:
+                return [user_id for user_id, active in users_statuses.items() if active is True]
 
-        if jenkins_users_ids is None:
-            # Retrieve all Jenkins users (active or `deleted`)
-            jenkins_users_ids = self.all_users()
+        if users_ids is None:
+            # Retrieve all Jenkins users (active or `deleted`) with their properties as they are loaded
+            users_statuses_iter = self.iter_all_users_statuses()
+        else:
+            users_statuses_iter = ((user_id, None) for user_id in users_ids)
 
-        # Retrieve active users
-        active_users_ids = []
-        for user_id in jenkins_users_ids:
-            if self.is_user_active(user_id) is True:
-                active_users_ids.append(user_id)
+        users_statuses = OrderedDict()
+
+        def unknown_users_ids():
+            for user_id, active in users_statuses_iter:
+                users_statuses[user_id] = active
+                if active is None:
+                    yield user_id
+
+        # Retrieve details of users whose properties are not known, up to `concurrency` users at a time,
+        # while the list of all users is still being loaded
+        def is_user_active(user_id):
+            return user_id, self.is_user_active(user_id)
 
-        return active_users_ids
+        probed = dict(imap_in_thread_pool(is_user_active, unknown_users_ids(), self.concurrency, ordered=False))
+
+        self.unknown_users_ids = [user_id for user_id, active in users_statuses.items()
+                                  if active is None and probed.get(user_id) is None]
+        if self.unknown_users_ids:
+            self.logger.warning("Status of {} users unknown: {}".format(
+                len(self.unknown_users_ids), ", ".join(self.unknown_users_ids)))
+
+        # Retrieve active users
+        return [
+            user_id for user_id, active in users_statuses.items()
+            if (probed.get(user_id) if active is None else active) is True
+        ]
 
     def all_users(self):
         """Retrieve all Jenkins users (active or `deleted`)
           Jenkins does not really delete user, but hides it from "views".
         """
-        request_data = DEFS.get_users(self.server)
-        ret = self.get_request(request_data.service_url, request_data.data)
+        return [self.user_id(user) for user in self.poll_users(DEFS.get_users(self.server))]
+
+    def iter_all_users_statuses(self):
+        """Yield (user_id, True if active; False if 'deleted'; None if the properties are not provided
+           (e.g. not permitted)) of all Jenkins users, as they are loaded
+        """
+        for user in self.poll_users(DEFS.get_users_with_properties(self.server)):
+            yield self.user_id(user), self.has_active_property(user['property']) if 'property' in user else None
+
+    def poll_users(self, request_data):
+        """Yield details of each user listed by `request_data` as soon as it appears.
+           Jenkins loads the list of all users asynchronously without telling when it is done, so the list
+           is polled (with backoff) until `POLL_STABLE_COUNT` consecutive polls find no new users and
+           `POLL_MIN_SECONDS` seconds have passed, or `people_deadline` seconds have passed.
+           A warning is logged if the listing may not be complete.
+        """
+        start = time.time()
+        deadline = start + self.people_deadline
+        delay = self.POLL_DELAY
+        seen = set()
+        unchanged_polls = 0
+        while True:
+            ret = self.get_request(request_data.service_url, request_data.data)
+            if 'users' not in ret:
+                self.logger.warning("Listing Jenkins users not completed: failed to retrieve the list")
+                return
+
+            new_cnt = 0
+            for u in ret['users']:
+                user_url = u['user']['absoluteUrl']
+                if user_url not in seen:
+                    seen.add(user_url)
+                    new_cnt += 1
+                    yield u['user']
+
+            unchanged_polls = 0 if new_cnt > 0 else unchanged_polls + 1
+            if unchanged_polls >= self.POLL_STABLE_COUNT and time.time() - start >= self.POLL_MIN_SECONDS:
+                if not seen:
+                    self.logger.warning("No Jenkins users listed")
+                return
+            if time.time() + delay > deadline:
+                self.logger.warning("Listing Jenkins users not completed in {} seconds".format(self.people_deadline))
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, self.POLL_MAX_DELAY)
+
+    def user_id(self, user):
+        """Return id of a user of the given details
+        """
+        return user['absoluteUrl'].replace('{}/user/'.format(self.server), '')
+
+    @staticmethod
+    def has_active_property(properties):
+        """Return `True` if the given properties of a user show that the user is active (not deleted)
+        """
+        return any(p.get('_class') == ACTIVE_USER_PROPERTY_CLASS for p in properties)
 
-        jenkins_users_ids = [
-            u['user']['absoluteUrl'].replace('{}/user/'.format(self.server), '') \
-            for u in ret['users']
-        ] if 'users' in ret else []
-        return jenkins_users_ids
+    def script_users_statuses(self):
+        """Return an `OrderedDict` of {user_id: True if active; False if 'deleted'} of all Jenkins users,
+           retrieved by one script run in the script console and kept for later calls; or None if failed.
+           The script is not run again once failed.
+        """
+        with self._script_lock:
+            if self._script_users_statuses is None and self._script_failed is False:
+                self._script_users_statuses = self.run_users_statuses_script()
+                self._script_failed = self._script_users_statuses is None
+            return self._script_users_statuses
+
+    def run_users_statuses_script(self):
+        """Run the script retrieving statuses of all users in the script console; return None if failed
+        """
+        request_data = DEFS.post_script_text(self.server, DEFS.USERS_STATUSES_SCRIPT)
+        self.request_crumb()
+        try:
+            response = self.session.post(
+                request_data.service_url, data=request_data.data, headers=FORM_HEADERS, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(e)
+            return None
+        if response.ok is False:
+            self.logger.error("{}: {}".format(response.status_code, response.reason))
+            return None
+        try:
+            return json.loads(response.text, object_pairs_hook=OrderedDict)
+        except ValueError as e:
+            self.logger.error("Unexpected output of script console: {}".format(e))
+            return None
 
     def is_user_active(self, user_id):
+        """Determine if a user is active or 'deleted' (in fact just hidden), from the statuses retrieved by the
+           script console if enabled; otherwise from the details of the user.
+        """
+        if self.script_console is True:
+            users_statuses = self.script_users_statuses()
+            if users_statuses is not None and user_id in users_statuses:
+                return users_statuses[user_id]
+        return self.request_is_user_active(user_id)
+
+    def request_is_user_active(self, user_id):
         """Retrieve details of a user and determine if it is active or 'deleted' (in fact just hidden).
+           Return None if the details cannot be retrieved.
         """
         request_data = DEFS.get_user(self.server, user_id)
         ret = self.get_request(request_data.service_url, request_data.data)
+        if not ret:
+            self.logger.error("Failed to retrieve details of user {}".format(user_id))
+            return None
 
         # If this user has the following property, it means this user is active (not deleted).
-        in_view = [
-            p for p in ret['property'] \
-            if p['_class'] == "hudson.security.HudsonPrivateSecurityRealm$Details"
-        ]
-        return len(in_view) > 0
+        return self.has_active_property(ret.get('property', []))
 
     def remove_user(self, user_id):
         """Return `True` if the user with the given `user_id` can be removed
            from the organisation; `False` otherwise
         """
         request_data = DEFS.post_do_delete_user(self.server, user_id)
-        try:
-            ret = self.post_request(request_data.service_url, request_data.data)
-        except requests.exceptions.ConnectionError as e:
-            # Because Jenkins API is crap
-            if 'Caused by NewConnectionError' not in e.message:
-                self.logger.error(e)
-                return False
-
+        # Jenkins responds 302 (redirecting to the users list) if succeeded, no need to follow it
+        ret = self.post_request(request_data.service_url, request_data.data, allow_redirects=False)
+        if ret is None:
             # Double checking if the user is inactive
-            ret = (self.is_user_active(user_id) is False)
+            ret = self.wait_until_user_inactive(user_id)
 
         self.logger.info("Checking: Has {} been deactivated? {}".format(user_id, ret))
         return ret
 
+    def wait_until_user_inactive(self, user_id):
+        """Return `True` if the user is found inactive, checking up to `DEACTIVATION_MAX_CHECKS` times
+           (with backoff); `False` otherwise
+        """
+        request_data = DEFS.get_user(self.server, user_id)
+        delay = self.POLL_DELAY
+        for check in range(self.DEACTIVATION_MAX_CHECKS):
+            if check > 0:
+                time.sleep(delay)
+                delay = min(delay * 2, self.POLL_MAX_DELAY)
+            ret = self.get_request(request_data.service_url, request_data.data)
+            if ret and self.has_active_property(ret.get('property', [])) is False:
+                return True
+        return False
+
+    def request_crumb(self):
+        """Retrieve the CSRF crumb (if CSRF protection is enabled) and send it with all requests of the session.
+           The crumb is requested once only.
+        """
+        with self._crumb_lock:
+            if self._crumb_requested is True:
+                return
+            self._crumb_requested = True
+
+            request_data = DEFS.get_crumb(self.server)
+            try:
+                response = self.session.get(request_data.service_url, params=request_data.data, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                self.logger.warning("Failed to retrieve crumb: {}".format(e))
+                return
+            if response.ok is False:
+                # E.g. 404 if CSRF protection is disabled
+                self.logger.debug("No crumb retrieved: {}: {}".format(response.status_code, response.reason))
+                return
+            ret = response.json()
+            self.session.headers[ret['crumbRequestField']] = ret['crumb']
+
     def get_request(self, service_url, service_data):
-        response = requests.get(
-            service_url,
-            params=service_data,
-            auth=(self.username, self.userpass)
-        )
+        try:
+            response = self.session.get(service_url, params=service_data, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(e)
+            return []
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
             return []
         return response.json()
 
-    def post_request(self, service_url, service_data):
-        response = requests.post(
-            service_url,
-            params=service_data,
-            headers=HEADERS,
-            auth=(self.username, self.userpass)
-        )
+    def post_request(self, service_url, service_data, allow_redirects=True):
+        """Return `True` if the request succeeded; `False` if it failed; None if it is not known
+           whether the request has been done (no response received)
+        """
+        self.request_crumb()
+        try:
+            response = self.session.post(
+                service_url, params=service_data, timeout=self.timeout, allow_redirects=allow_redirects)
+        except requests.exceptions.ConnectionError as e:
+            self.logger.error(e)
+            # Because Jenkins API is crap, the connection can be dropped even if the request is done
+            return None if 'NewConnectionError' in str(e) else False
+        except requests.exceptions.Timeout as e:
+            self.logger.error(e)
+            return None
+        except requests.exceptions.RequestException as e:
+            self.logger.error(e)
+            return False
         if response.ok is False:
             self.logger.error("{}: {}".format(response.status_code, response.reason))
         return response.ok
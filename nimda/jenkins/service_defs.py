@@ -26,6 +26,24 @@ def get_users(server):
     )
 
 
+def get_users_with_properties(server):
+    """GET request for retrieving all users with the classes of their properties.
+    """
+    return RequestData(
+        service_url= "{}/asynchPeople/api/json".format(server),
+        data={'tree': 'users[user[id,absoluteUrl,property[_class]]]'}
+    )
+
+
+def get_crumb(server):
+    """GET request for retrieving the CSRF crumb to be sent with POST requests.
+    """
+    return RequestData(
+        service_url= "{}/crumbIssuer/api/json".format(server),
+        data={}
+    )
+
+
 def post_do_delete_user(server, user_id):
     """POST request for deleting an user from Jenkins.
 
@@ -36,3 +54,24 @@ def post_do_delete_user(server, user_id):
         service_url= "{}/user/{}/doDelete".format(server, user_id),
         data={}
     )
+
+
+# Groovy script printing {user_id: True if the user has the property of an active user} of all users
+USERS_STATUSES_SCRIPT = """
+import groovy.json.JsonOutput
+import hudson.model.User
+import hudson.security.HudsonPrivateSecurityRealm
+
+println(JsonOutput.toJson(User.getAll().collectEntries { u ->
+    [(u.getUrl() - 'user/'): u.getProperty(HudsonPrivateSecurityRealm.Details) != null]
+}))
+"""
+
+
+def post_script_text(server, script):
+    """POST request for running a Groovy script in the script console, which responds with the script output.
+    """
+    return RequestData(
+        service_url= "{}/scriptText".format(server),
+        data={'script': script}
+    )
@@ -1,5 +1,7 @@
 import logging
+import requests
 import requests_mock
+from six.moves.urllib.parse import parse_qs
 
 from nimda.jenkins.jenkins_helper import JenkinsHelper
 import nimda.jenkins.service_defs as DEFS
@@ -49,6 +51,123 @@ def test_jenkins_active_users():
         assert 'user1' in ret
 
 
+def test_jenkins_active_users_bulk():
+    """Test JenkinsHelper active_users reads properties of all users in one request
+    """
+    with requests_mock.mock() as mock_adapter:
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger)
+
+        request_data = DEFS.get_users_with_properties(TEST_SERVER)
+        mock_adapter.get(request_data.service_url,
+            status_code=200,
+            json={
+                "users": [
+                    {'user': {'absoluteUrl': '{}/user/user1'.format(TEST_SERVER), 'id': 'user1', 'property': [
+                        {"_class": "hudson.model.MyViewsProperty"},
+                        {"_class": "hudson.security.HudsonPrivateSecurityRealm$Details"},
+                    ]}},
+                    {'user': {'absoluteUrl': '{}/user/user2'.format(TEST_SERVER), 'id': 'user2', 'property': [
+                        {"_class": "hudson.model.MyViewsProperty"},
+                    ]}},
+                    # Properties not provided, so to be requested
+                    {'user': {'absoluteUrl': '{}/user/user3'.format(TEST_SERVER), 'id': 'user3'}},
+                ]
+            }
+        )
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user3').service_url,
+            status_code=200,
+            json={
+                "id": "user3",
+                "property": [
+                    {"_class": "hudson.security.HudsonPrivateSecurityRealm$Details"}
+                ]
+            }
+        )
+
+        helper.POLL_DELAY = helper.POLL_MIN_SECONDS = 0
+        assert helper.active_users() == ['user1', 'user3']
+        # The list of users is polled again to confirm all users have been loaded
+        assert mock_adapter.call_count == 1 + helper.POLL_STABLE_COUNT + 1
+        assert mock_adapter.request_history[0].qs['tree'] == [request_data.data['tree'].lower()]
+
+
+def test_jenkins_active_users_concurrently():
+    """Test JenkinsHelper active_users retrieves details of users concurrently, and returns them in order
+    """
+    with requests_mock.mock() as mock_adapter:
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, concurrency=4, timeout=5)
+
+        user_ids = ['user{}'.format(i) for i in range(10)]
+        for i, user_id in enumerate(user_ids):
+            mock_adapter.get(DEFS.get_user(TEST_SERVER, user_id).service_url,
+                status_code=200,
+                json={
+                    "id": user_id,
+                    "property": [
+                        {"_class": "hudson.security.HudsonPrivateSecurityRealm$Details"}
+                    ] if i % 2 == 0 else []
+                }
+            )
+        # A user whose details cannot be retrieved is not active, but of unknown status
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user4').service_url, exc=requests.exceptions.ReadTimeout)
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user6').service_url, status_code=404)
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user7').service_url,
+                         exc=requests.exceptions.ConnectionError('Connection refused'))
+
+        assert helper.active_users(user_ids) == ['user0', 'user2', 'user8']
+        assert helper.unknown_users_ids == ['user4', 'user6', 'user7']
+        assert mock_adapter.call_count == 10
+
+
+def test_jenkins_script_console():
+    """Test JenkinsHelper active_users and is_user_active answered by one script run in the script console
+    """
+    with requests_mock.mock() as mock_adapter:
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, script_console=True)
+
+        # Mock get_crumb return 404 for CSRF protection disabled
+        mock_adapter.get(DEFS.get_crumb(TEST_SERVER).service_url, status_code=404)
+
+        request_data = DEFS.post_script_text(TEST_SERVER, DEFS.USERS_STATUSES_SCRIPT)
+        mock_adapter.post(request_data.service_url,
+            status_code=200,
+            text='{"user1":true,"user2":false,"user3":true}\n'
+        )
+
+        assert helper.active_users() == ['user1', 'user3']
+        assert helper.is_user_active('user1') is True
+        assert helper.is_user_active('user2') is False
+        assert helper.active_users(['user3', 'user2']) == ['user3']
+        assert mock_adapter.call_count == 2
+
+        request = mock_adapter.request_history[1]
+        assert request.headers['content-type'] == 'application/x-www-form-urlencoded'
+        assert 'HudsonPrivateSecurityRealm.Details' in parse_qs(request.text)['script'][0]
+
+        # Fall back to details of each user if the script console is not permitted
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, script_console=True)
+        mock_adapter.post(request_data.service_url, status_code=403)
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user1').service_url,
+            status_code=200,
+            json={"id": "user1", "property": [{"_class": "hudson.security.HudsonPrivateSecurityRealm$Details"}]}
+        )
+        assert helper.active_users(['user1']) == ['user1']
+
+        # The script is run once only, even if failed and users are probed concurrently
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger, script_console=True,
+                               concurrency=4)
+        user_ids = ['user{}'.format(i) for i in range(5)]
+        for user_id in user_ids:
+            mock_adapter.get(DEFS.get_user(TEST_SERVER, user_id).service_url,
+                status_code=200,
+                json={"id": user_id, "property": [{"_class": "hudson.security.HudsonPrivateSecurityRealm$Details"}]}
+            )
+        call_count = mock_adapter.call_count
+        assert helper.active_users(user_ids) == user_ids
+        assert helper.is_user_active('user1') is True
+        assert [r.method for r in mock_adapter.request_history[call_count:]].count('POST') == 1
+
+
 def test_jenkins_all_users():
     """Test JenkinsHelper all_users
     """
@@ -65,6 +184,7 @@ def test_jenkins_all_users():
                 ]
             }
         )
+        helper.POLL_DELAY = helper.POLL_MIN_SECONDS = 0
         ret = helper.all_users()
         assert len(ret)==2
         assert 'user1' in ret and 'user2' in ret
@@ -76,6 +196,54 @@ def test_jenkins_all_users():
         )
         ret = helper.all_users()
         assert len(ret) == 0
+        assert mock_adapter.call_count == 1 + helper.POLL_STABLE_COUNT + 1
+
+
+def test_jenkins_all_users_polling():
+    """Test JenkinsHelper all_users polls the list of users until no new users are loaded, or the deadline
+    """
+    def users_json(*ids):
+        return {"users": [{'user': {'absoluteUrl': '{}/user/{}'.format(TEST_SERVER, i)}} for i in ids]}
+
+    with requests_mock.mock() as mock_adapter:
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger)
+        helper.POLL_DELAY = helper.POLL_MIN_SECONDS = 0
+
+        # Polls finding no new users do not end the listing until several of them in a row
+        mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url, [
+            {"status_code": 200, "json": users_json()},
+            {"status_code": 200, "json": users_json()},
+            {"status_code": 200, "json": users_json('user1')},
+            {"status_code": 200, "json": users_json('user1')},
+            {"status_code": 200, "json": users_json('user1', 'user2', 'user3')},
+            {"status_code": 200, "json": users_json('user1', 'user2', 'user3')},
+        ])
+        assert helper.all_users() == ['user1', 'user2', 'user3']
+        assert mock_adapter.call_count == 5 + helper.POLL_STABLE_COUNT
+
+        # Users are yielded as soon as they are loaded
+        mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url, [
+            {"status_code": 200, "json": users_json('user1')},
+            {"status_code": 200, "json": users_json('user1', 'user2')},
+        ])
+        users = helper.poll_users(DEFS.get_users(TEST_SERVER))
+        assert next(users)['absoluteUrl'].endswith('user1')
+        assert mock_adapter.call_count == 5 + helper.POLL_STABLE_COUNT + 1
+
+        # Nor before the min number of seconds
+        helper.POLL_MIN_SECONDS = 60
+        helper.people_deadline = 0.1
+        mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url, status_code=200, json=users_json('user1'))
+        assert helper.all_users() == ['user1']
+        assert mock_adapter.call_count > 5 + helper.POLL_STABLE_COUNT + 1 + helper.POLL_STABLE_COUNT + 1
+
+        # Polling stops at the deadline even if users are still being loaded
+        helper.people_deadline = 0
+        mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url, [
+            {"status_code": 200, "json": users_json('user1')},
+            {"status_code": 200, "json": users_json('user1', 'user2')},
+        ])
+        assert helper.all_users() == ['user1']
 
 
 def test_jenkins_is_user_active():
@@ -117,6 +285,12 @@ def test_jenkins_helper_remove_user_from_organisation():
     with requests_mock.mock() as mock_adapter:
         helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger)
 
+        # Mock get_crumb return a crumb
+        mock_adapter.get(DEFS.get_crumb(TEST_SERVER).service_url,
+            status_code=200,
+            json={"crumb": "crumb1", "crumbRequestField": "Jenkins-Crumb"}
+        )
+
         # Mock delete_user_from_organisation return 200
         mock_adapter.post(
             DEFS.post_do_delete_user(TEST_SERVER, 'user1').service_url,
@@ -131,3 +305,58 @@ def test_jenkins_helper_remove_user_from_organisation():
         )
         assert helper.remove_user('user2') is False
 
+        # Mock post_do_delete_user return 302 redirecting to the users list, not to be followed
+        mock_adapter.post(
+            DEFS.post_do_delete_user(TEST_SERVER, 'user3').service_url,
+            status_code=302,
+            headers={'Location': '{}/asynchPeople/'.format(TEST_SERVER)}
+        )
+        assert helper.remove_user('user3') is True
+
+        # The crumb is requested once and sent with all POST requests
+        assert [r.method for r in mock_adapter.request_history] == ['GET', 'POST', 'POST', 'POST']
+        assert all(r.headers['Jenkins-Crumb'] == 'crumb1' for r in mock_adapter.request_history[1:])
+
+
+def test_jenkins_helper_remove_user_connection_error():
+    """Test JenkinsHelper remove_user checks if the user has been deactivated if the deletion is not confirmed
+    """
+    with requests_mock.mock() as mock_adapter:
+        helper = JenkinsHelper(TEST_AUTH_USER, TEST_AUTH_PASS, TEST_SERVER, test_logger)
+        helper.POLL_DELAY = 0
+        mock_adapter.get(DEFS.get_crumb(TEST_SERVER).service_url, status_code=404)
+
+        mock_adapter.post(
+            DEFS.post_do_delete_user(TEST_SERVER, 'user1').service_url,
+            exc=requests.exceptions.ConnectionError('Caused by NewConnectionError')
+        )
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user1').service_url, [
+            {"status_code": 503},
+            {"status_code": 200, "json": {"id": "user1", "property": [
+                {"_class": "hudson.security.HudsonPrivateSecurityRealm$Details"}]}},
+            {"status_code": 200, "json": {"id": "user1", "property": []}},
+        ])
+        assert helper.remove_user('user1') is True
+        assert mock_adapter.call_count == 1 + 1 + 3
+
+        # Checks are bounded
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user1').service_url, status_code=503)
+        assert helper.remove_user('user1') is False
+        assert mock_adapter.call_count == 5 + 1 + helper.DEACTIVATION_MAX_CHECKS
+
+        # Other connection errors fail immediately
+        mock_adapter.post(
+            DEFS.post_do_delete_user(TEST_SERVER, 'user2').service_url,
+            exc=requests.exceptions.ConnectionError('Connection refused')
+        )
+        assert helper.remove_user('user2') is False
+        assert mock_adapter.call_count == 5 + 1 + helper.DEACTIVATION_MAX_CHECKS + 1
+
+        # A deletion timed out is checked as well, rather than aborting the off boarding
+        mock_adapter.post(
+            DEFS.post_do_delete_user(TEST_SERVER, 'user3').service_url,
+            exc=requests.exceptions.ReadTimeout
+        )
+        mock_adapter.get(DEFS.get_user(TEST_SERVER, 'user3').service_url,
+            status_code=200, json={"id": "user3", "property": []})
+        assert helper.remove_user('user3') is True
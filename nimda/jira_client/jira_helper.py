@@ -2,17 +2,62 @@
 JIRA helper
 """
 from __future__ import print_function
+from collections import OrderedDict
 from jira.client import JIRA
+from jira.exceptions import JIRAError
+import threading
 
+from nimda.utils import imap_in_thread_pool
 
-class JiraHelper(JIRA):
 
-    def __init__(self, useremail, userpass, server, logger):
+# Default max number of concurrent requests (1 for sequential requests)
+DEFAULT_CONCURRENCY = 1
+
+# Default number of members per page of group members
+DEFAULT_PAGE_SIZE = 50
+
+# `JIRA` clients connected in this process, by (server, useremail)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def jira_client(useremail, userpass, server):
+    """Return the `JIRA` client of `useremail` connected to `server`, connecting on the first call only
+    """
+    key = (server, useremail)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = JIRA(basic_auth=(useremail, userpass), options={'server': server})
+        return _clients[key]
+
+
+class JiraHelper(object):
+    """Extend a `JIRA` client, which is connected on first use and shared by all helpers of the same
+       server and user. Attributes not defined by the helper are looked up in the client.
+    """
+
+    def __init__(self, useremail, userpass, server, logger, concurrency=DEFAULT_CONCURRENCY,
+                 page_size=DEFAULT_PAGE_SIZE):
+        self.useremail = useremail
+        self.userpass = userpass
+        self.server = server
         self.logger = logger
-        JIRA.__init__(
-            self, basic_auth=(useremail, userpass),
-            options={'server': server}
-        )
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self._client = None
+
+    @property
+    def client(self):
+        """The `JIRA` client
+        """
+        if self._client is None:
+            self._client = jira_client(self.useremail, self.userpass, self.server)
+        return self._client
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == '_client':
+            raise AttributeError(name)
+        return getattr(self.client, name)
 
     def on_board(self):
         #TODO
@@ -26,28 +71,110 @@ class JiraHelper(JIRA):
         """
         err_cnt = 0
 
-        # 1. Remove user of username from all groups
-        group_list = self.groups()
-        for groupname in group_list:
-            if username in self.group_members(groupname).keys():
-                self.logger.info("Removing {} from group {} ...".format(username, groupname))
-                if self.remove_user_from_group(username, groupname) is not True:
-                    self.logger.error("Failed to remove user {} from group {}".format(username, groupname))
-                    err_cnt += 1
-
-        # 2. Revoking application access
-        self.logger.info("Revoking application access (actual license count)...")
-        if self.revoke_application_access(username) is False:
-            err_cnt +=1
-
-        # 3. Deactivate user (not deleting user)
-        self.logger.info("Deactivating user ...")
-        if self.deactivate_user(username) is False:
-            self.logger.error("Failed to deactivate user")
-            err_cnt += 1
+        try:
+            group_list = self.user_groups(username)
+        except JIRAError as e:
+            # As in `remove_all_access_many`, a user who cannot be looked up is not revoked nor deactivated
+            self.logger.error("Failed to look up groups of user {}: {}".format(username, e))
+            return False
+
+        # 1. Remove user of username from all groups (up to `concurrency` groups at a time)
+        def remove_from_group(groupname):
+            return self._remove_from_group(username, groupname)
+
+        for removed in imap_in_thread_pool(remove_from_group, group_list, self.concurrency):
+            if removed is not True:
+                err_cnt += 1
+
+        # 2. Revoke application access and deactivate user
+        err_cnt += self._revoke_and_deactivate(username)
 
         return err_cnt == 0
 
+    def remove_all_access_many(self, usernames):
+        """Remove all JIRA related access of each user of `usernames`, and return an `OrderedDict` of
+           {username: True if succeeded; False otherwise}.
+           The groups of all users are looked up first. Then all removals from groups, followed by the
+           revoking and deactivation of all users, run up to `concurrency` requests at a time.
+        """
+        err_cnts = OrderedDict((username, 0) for username in usernames)
+
+        # 1. Look up groups of all users
+        def user_groups(username):
+            try:
+                return username, self.user_groups(username)
+            except JIRAError as e:
+                self.logger.error("Failed to look up groups of user {}: {}".format(username, e))
+                return username, None
+
+        removals = []
+        found = []
+        for username, group_list in imap_in_thread_pool(user_groups, list(err_cnts.keys()), self.concurrency):
+            if group_list is None:
+                err_cnts[username] += 1
+            else:
+                found.append(username)
+                removals.extend((username, groupname) for groupname in group_list)
+
+        # 2. Remove all users from all their groups
+        def remove_from_group(removal):
+            return removal[0], self._remove_from_group(*removal)
+
+        for username, removed in imap_in_thread_pool(remove_from_group, removals, self.concurrency):
+            if removed is not True:
+                err_cnts[username] += 1
+
+        # 3. Revoke application access and deactivate users found
+        def revoke_and_deactivate(username):
+            return username, self._revoke_and_deactivate(username)
+
+        for username, err_cnt in imap_in_thread_pool(revoke_and_deactivate, found, self.concurrency):
+            err_cnts[username] += err_cnt
+
+        return OrderedDict((username, err_cnt == 0) for username, err_cnt in err_cnts.items())
+
+    def _remove_from_group(self, username, groupname):
+        """Return `True` if the user can be removed from the group; `False` otherwise
+        """
+        self.logger.info("Removing {} from group {} ...".format(username, groupname))
+        try:
+            removed = self.remove_user_from_group(username, groupname)
+        except JIRAError as e:
+            self.logger.error("Failed to remove user {} from group {}: {}".format(username, groupname, e))
+            return False
+        if removed is not True:
+            self.logger.error("Failed to remove user {} from group {}".format(username, groupname))
+            return False
+        return True
+
+    def _revoke_and_deactivate(self, username):
+        """Revoke application access and deactivate (not delete) the user; return the number of errors
+        """
+        err_cnt = 0
+        self.logger.info("Revoking application access (actual license count) of {} ...".format(username))
+        try:
+            if self.revoke_application_access(username) is False:
+                err_cnt += 1
+        except JIRAError as e:
+            self.logger.error("Failed to revoke application access of {}: {}".format(username, e))
+            err_cnt += 1
+
+        self.logger.info("Deactivating user {} ...".format(username))
+        try:
+            if self.deactivate_user(username) is False:
+                self.logger.error("Failed to deactivate user {}".format(username))
+                err_cnt += 1
+        except JIRAError as e:
+            self.logger.error("Failed to deactivate user {}: {}".format(username, e))
+            err_cnt += 1
+        return err_cnt
+
+    def user_groups(self, username):
+        """Return a `list` of names of the groups the user belongs to, retrieved with the user in one request
+        """
+        user = self.user(username, expand='groups')
+        return [g['name'] for g in user.raw.get('groups', {}).get('items', [])]
+
     def revoke_application_access(self, username):
         """Extend `JIRA` to support also revoke application access (the actual license count)
         """
@@ -59,12 +186,41 @@ class JiraHelper(JIRA):
             return False
         return True
 
+    def iter_group_members(self, groupname):
+        """Yield (username, `dict` with keys `name`, `fullname`, `email` and `active`) of each member of a group,
+           reading one page of `page_size` members at a time
+        """
+        params = {
+            'groupname': groupname,
+            'includeInactiveUsers': True,
+            'startAt': 0,
+            'maxResults': self.page_size,
+        }
+        while True:
+            ret = self._get_json('group/member', params=params)
+            for user in ret['values']:
+                username = user.get('name') or user.get('accountId')
+                yield username, {
+                    'name': username,
+                    'fullname': user.get('displayName'),
+                    'email': user.get('emailAddress', 'hidden'),
+                    'active': user.get('active'),
+                }
+            if ret.get('isLast', True) or not ret['values']:
+                return
+            params['startAt'] += len(ret['values'])
+
     def members_in_all_groups(self):
-        """Return members in all groups
+        """Return members in all groups.
+           Members of up to `concurrency` groups are retrieved at a time, and merged in the order of the groups.
         """
+        def group_members(group):
+            self.logger.info('Checking group {} ...'.format(group))
+            return group, list(self.iter_group_members(group))
+
         all_users = {}
-        for group in self.groups():
-            for k, v in self.group_members(group).items():
+        for group, members in imap_in_thread_pool(group_members, self.groups(), self.concurrency):
+            for k, v in members:
                 if k not in all_users.keys():
                     v.update({'group': [group]})
                     all_users[k] = v
@@ -1,6 +1,7 @@
 import logging
 import requests_mock
 from jira import JIRA
+from jira.exceptions import JIRAError
 from mock import Mock
 
 from nimda.jira_client.jira_helper import JiraHelper
@@ -11,7 +12,7 @@ test_logger.addHandler(logging.StreamHandler())
 
 
 def test_jira_helper():
-    """Test JiraHelper remove_all_access and members_in_all_groups
+    """Test JiraHelper remove_all_access, user_groups and members_in_all_groups
     """
     with requests_mock.mock() as mock_adapter:
         JIRA.__init__ = Mock(return_value=None)
@@ -20,15 +21,17 @@ def test_jira_helper():
         helper._options = {'server': 'https://example.com'}
 
         helper.groups = Mock(return_value=['group1', 'group2'])
-        helper.group_members = Mock(side_effect=
-            [
-                {'username1': {'active': True, 'fullname': 'User1 Hello', 'email': 'user1@example.com'}},
-                {'username2': {'active': True, 'fullname': 'User2 Hello', 'email': 'user2@example.com'}},
-                {'username3': {'active': True, 'fullname': 'User3 Hello', 'email': 'user3@example.com'}},
-                {'username4': {'active': True, 'fullname': 'User4 Hello', 'email': 'user4@example.com'}},
-                {'username5': {'active': True, 'fullname': 'User5 Hello', 'email': 'user5@example.com'}},
-                {'username6': {'active': True, 'fullname': 'User6 Hello', 'email': 'user6@example.com'}},
-            ])
+        helper._get_json = Mock(side_effect=lambda path, params: {
+            'values': [
+                {'name': 'username1', 'active': True, 'displayName': 'User1 Hello', 'emailAddress': 'user1@example.com'},
+                {'name': 'username2', 'active': True, 'displayName': 'User2 Hello', 'emailAddress': 'user2@example.com'},
+            ],
+            'isLast': True
+        })
+        helper.user = Mock(return_value=Mock(raw={
+            'name': 'user1',
+            'groups': {'size': 2, 'items': [{'name': 'group1'}, {'name': 'group2'}]}
+        }))
         helper.remove_user_from_group = Mock(return_value=True)
         helper.deactivate_user = Mock(return_value=True)
         helper.revoke_application_access = Mock(side_effect=[True, False])
@@ -37,9 +40,117 @@ def test_jira_helper():
         ret = helper.members_in_all_groups()
         assert type(ret) is dict
         assert 'username1' in ret.keys() and 'username2' in ret.keys()
+        assert ret['username1']['group'] == ['group1', 'group2']
 
-        # Second calls should return True
+        # Test user_groups
+        assert helper.user_groups('user1') == ['group1', 'group2']
+        helper.user.assert_called_with('user1', expand='groups')
+
+        # First call should return True
         assert helper.remove_all_access("user1") is True
+        assert helper.remove_user_from_group.call_count == 2
 
         # Second calls should return False
         assert helper.remove_all_access("user2") is False
+
+
+def test_jira_helper_members_in_all_groups_pages():
+    """Test JiraHelper members_in_all_groups reads all pages of group members, concurrently
+    """
+    JIRA.__init__ = Mock(return_value=None)
+
+    helper = JiraHelper('user@example.com', 'userpass', 'https://example.com', test_logger,
+                        concurrency=4, page_size=2)
+    helper.groups = Mock(return_value=['group{}'.format(i) for i in range(8)])
+
+    def get_json(path, params):
+        assert path == 'group/member' and params['maxResults'] == 2
+        # Each group has 3 members: user0 and 2 members of its own
+        members = ['user0', '{}-user1'.format(params['groupname']), '{}-user2'.format(params['groupname'])]
+        page = members[params['startAt']:params['startAt'] + params['maxResults']]
+        return {
+            'values': [{'name': m, 'displayName': m, 'active': True} for m in page],
+            'isLast': params['startAt'] + len(page) >= len(members),
+        }
+    helper._get_json = Mock(side_effect=get_json)
+
+    ret = helper.members_in_all_groups()
+    assert len(ret) == 1 + 8 * 2
+    assert ret['user0']['group'] == ['group{}'.format(i) for i in range(8)]
+    assert ret['group5-user2'] == {
+        'name': 'group5-user2', 'fullname': 'group5-user2', 'email': 'hidden', 'active': True, 'group': ['group5']}
+    assert helper._get_json.call_count == 8 * 2
+
+
+def test_jira_helper_client():
+    """Test JiraHelper connects its JIRA client on first use, shared by helpers of the same server and user
+    """
+    JIRA.__init__ = Mock(return_value=None)
+    groups = JIRA.groups
+    JIRA.groups = Mock(return_value=['group1'])
+
+    helper1 = JiraHelper('client@example.com', 'userpass', 'https://client.example.com', test_logger)
+    helper2 = JiraHelper('client@example.com', 'userpass', 'https://client.example.com', test_logger)
+    helper3 = JiraHelper('other@example.com', 'userpass', 'https://client.example.com', test_logger)
+    assert JIRA.__init__.call_count == 0
+
+    assert helper1.groups() == ['group1']
+    assert JIRA.__init__.call_count == 1
+    JIRA.__init__.assert_called_with(
+        basic_auth=('client@example.com', 'userpass'), options={'server': 'https://client.example.com'})
+
+    assert helper2.client is helper1.client
+    assert JIRA.__init__.call_count == 1
+
+    assert helper3.client is not helper1.client
+    assert JIRA.__init__.call_count == 2
+
+    JIRA.groups = groups
+
+
+def test_jira_helper_remove_all_access_many():
+    """Test JiraHelper remove_all_access_many returns result of each user
+    """
+    JIRA.__init__ = Mock(return_value=None)
+
+    helper = JiraHelper('user@example.com', 'userpass', 'https://example.com', test_logger, concurrency=4)
+
+    def user(username, expand):
+        if username == 'user3':
+            raise JIRAError(status_code=404, text='User does not exist')
+        return Mock(raw={'groups': {'items': [{'name': 'group1'}, {'name': 'group2'}]}})
+
+    calls = []
+    helper.user = Mock(side_effect=user)
+    helper.remove_user_from_group = Mock(side_effect=lambda u, g: calls.append((u, g)) or (u, g) != ('user2', 'group2'))
+    helper.revoke_application_access = Mock(side_effect=lambda u: calls.append((u, 'revoke')) or True)
+    helper.deactivate_user = Mock(side_effect=lambda u: calls.append((u, 'deactivate')) or True)
+
+    ret = helper.remove_all_access_many(['user1', 'user2', 'user3'])
+    assert list(ret.items()) == [('user1', True), ('user2', False), ('user3', False)]
+
+    # Groups are removed before revoking and deactivating, and users not found are skipped
+    assert helper.remove_user_from_group.call_count == 4
+    assert sorted(calls[4:]) == [
+        ('user1', 'deactivate'), ('user1', 'revoke'), ('user2', 'deactivate'), ('user2', 'revoke')]
+
+    # An error of a user's request fails that user only
+    def remove_user_from_group(username, groupname):
+        if username == 'user2':
+            raise JIRAError(status_code=400, text='Bad request')
+        return True
+    helper.remove_user_from_group = Mock(side_effect=remove_user_from_group)
+
+    def deactivate_user(username):
+        if username == 'user4':
+            raise JIRAError(status_code=500, text='Failed')
+        return True
+    helper.deactivate_user = Mock(side_effect=deactivate_user)
+    ret = helper.remove_all_access_many(['user1', 'user2', 'user4'])
+    assert list(ret.items()) == [('user1', True), ('user2', False), ('user4', False)]
+    assert helper.deactivate_user.call_count == 3
+
+    # A user who cannot be looked up is reported as failed, rather than raising
+    helper.deactivate_user.reset_mock()
+    assert helper.remove_all_access('user3') is False
+    assert helper.deactivate_user.call_count == 0
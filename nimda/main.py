@@ -2,6 +2,7 @@
 App's main
 """
 from __future__ import print_function
+from collections import OrderedDict
 import datetime
 import os
 import sys
@@ -54,10 +55,11 @@ SERVICES_TRANSFER = [
 def reporting(user_acc_service, configs, app_logger):
     """Write reports for each service and also the database
     """
+    accounts_index = user_acc_service.index_accounts(user_acc_service.users, SERVICES_REPORT)
     for service in SERVICES_REPORT:
         app_logger.info("############################################################")
         app_logger.info("Reporting {} users ...".format(service.database_attr_name()))
-        service(configs, app_logger).summary(user_acc_service.users)
+        service(configs, app_logger).summary(user_acc_service.users, accounts_index)
 
     # Database
     app_logger.info("############################################################")
@@ -65,47 +67,71 @@ def reporting(user_acc_service, configs, app_logger):
     user_acc_service.summary()
 
 
-def off_board_user(user_acc_service, username, new_status, services, configs, app_logger):
-    """Off board user of `username` from these `services`.
+def off_board_users(user_acc_service, user_records, new_status, services, configs, app_logger):
+    """Off board users of `user_records` ({username: user record holding all accounts that the user
+       currently has}) from these `services`, in one batch per service, then update their database
+       records.
        `new_status` can be `suspended` or `transferred`.
     """
-    # Retrieve all accounts that the user of `username` currently has
-    user_accs_dict = user_acc_service.users[username]
+    # Update dynamodb users' status to `new_status` first.
+    previous_statuses = {}
+    for username, user_accs_dict in user_records.items():
+        previous_statuses[username] = user_accs_dict.get(ATTR_STATUS)
+        user_accs_dict[ATTR_STATUS] = new_status
+
+    # Start off boarding users from each service
+    removed_attrs = OrderedDict((username, []) for username in user_records.keys())
+    for service in services:
+        attr = service.database_attr_name()
+        app_logger.info("Checking {} ...".format(attr))
+
+        # Retrieve the corresponding acc names and also remove them from the user records
+        service_instance = service(configs, app_logger)
+        acc_names = service_instance.account_names(user_records)
+        for username in acc_names.keys():
+            user_records[username].pop(attr, None)
+        if not acc_names:
+            continue
+
+        results = service_instance.off_board_many(list(acc_names.values()))
+        for username, acc_name in acc_names.items():
+            if results.get(acc_name) is False:
+                app_logger.error("Failed to off board {} from {}".format(username, attr))
+            removed_attrs[username].append(attr)
+
+    updated = OrderedDict()
+    for username, attrs in removed_attrs.items():
+        if attrs:
+            updated[username] = (attrs, previous_statuses[username])
+        else:
+            app_logger.info("No change has been made for {}".format(username))
 
-    # Update dynamodb user's status to `new_status` first.
-    user_accs_dict[ATTR_STATUS] = new_status
+    if updated:
+        # Update only the changed attributes, and only if no one else has changed the status since
+        app_logger.info("Updating {} database records ...".format(len(updated)))
+        for username, succeeded in user_acc_service.update_status_many(new_status, updated).items():
+            if succeeded is False:
+                app_logger.error("Failed to update database record of {}".format(username))
+
+
+def split_usernames(value):
+    """Return list of usernames given in a comma separated `value`
+    """
+    return [u.strip() for u in value.split(',') if u.strip()]
 
-    # Start off boarding user from each service
-    updated = False
-    for service in services:
-        app_logger.info("Checking {} ...".format(service.database_attr_name()))
-        if service.database_attr_name() in user_accs_dict.keys():
-            service_obj = service(configs, app_logger)
-
-            # Retrieve the corresponding acc name and also remove it from `user_accs_dict`
-            acc_name = user_accs_dict.pop(service.database_attr_name())
-            service_obj.off_board(acc_name)
-            updated = True
-
-    if updated is True:
-        # Update database record of this user
-        app_logger.info("Updating database record ...")
-        user_acc_service.off_board(user_accs_dict)
-    else:
-        app_logger.info("No change has been made")
 
 def get_action_params(args):
     """Determine what action to do
     """
     if args.offboard is not None:
         return {
-            'username': args.offboard,
+            'usernames': split_usernames(args.offboard),
             'new_status': ATTR_STATUS_SUSPENDED,
             'services': SERVICES_OFF_BOARD
         }
     if args.transfer is not None:
         return {
-            'username': args.transfer,
+            'usernames': split_usernames(args.transfer),
             'new_status': ATTR_STATUS_TRANSFERRED,
             'services': SERVICES_TRANSFER
         }
@@ -125,23 +151,28 @@ def start_process(configs, action_params=None):
     app_logger.info("Start time: {}".format(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
 
     try:
-        # Get all existing users' accounts first
-        user_acc_service = UserAccs(configs, app_logger)
+        # Users to off board are looked up with only the attributes used by the services, as only
+        # these attributes are updated
+        attributes = None if action_params is None else UserAccs.attributes_of(action_params['services'])
+        user_acc_service = UserAccs(configs, app_logger, attributes=attributes)
 
         if action_params is None:
             # Do reporting
             reporting(user_acc_service, configs, app_logger)
         else:
             # Do off boarding (or transferring people to other business group)
-            username = action_params['username']
+            usernames = action_params['usernames']
             new_status = action_params['new_status']
             services = action_params['services']
 
-            if username not in user_acc_service.users.keys():
-                app_logger.error("{} not found in database. Aborted.".format(username))
+            # Validate all users in one go, with their latest records
+            found, not_found = user_acc_service.find_users(usernames)
+            if not_found:
+                app_logger.error("{} not found in database. Aborted.".format(", ".join(not_found)))
                 return 1
+            user_records = OrderedDict((u, found[u]) for u in usernames)
 
-            off_board_user(user_acc_service, username, new_status, services, configs, app_logger)
+            off_board_users(user_acc_service, user_records, new_status, services, configs, app_logger)
 
     except Exception as e:
         app_logger.error(e)
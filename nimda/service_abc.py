@@ -2,6 +2,7 @@
 Define abstract class for implementing supported off/on boarding services.
 """
 import abc
+from collections import OrderedDict
 import os
 import six
 
@@ -45,25 +46,50 @@ class ServiceABC():
         """
         pass
 
+    def account_names(self, user_records):
+        """Return an `OrderedDict` of {username: account name} of the users of `user_records`
+           ({username: user record}) having an account of this service
+        """
+        attr = self.database_attr_name()
+        return OrderedDict((username, v[attr]) for username, v in user_records.items() if attr in v.keys())
+
+    def off_board_many(self, user_data_list):
+        """Start off boarding of each of `user_data_list`, and return an `OrderedDict` of
+           {user_data: True if succeeded; False otherwise}
+        """
+        return OrderedDict((user_data, self.off_board(user_data)) for user_data in user_data_list)
+
     @abc.abstractmethod
-    def summary(self, db_users_dict):
+    def summary(self, db_users_dict, accounts_index=None):
         """Retrieve current user details and compare against the database users' details.
         """
         pass
 
-    def report_inactive_users_still_have_access(self, db_users_dict):
+    def database_accounts(self, db_users_dict, accounts_index=None):
+        """Return {account_name: [user_record, ...]} of database users having an account of this service,
+           looked up in `accounts_index` ({attr: {account_name: [user_record, ...]}}) if given
+        """
+        attr = self.database_attr_name()
+        if accounts_index is not None:
+            return accounts_index.get(attr, {})
+        accounts = {}
+        for v in db_users_dict.values():
+            if attr in v.keys():
+                accounts.setdefault(v[attr], []).append(v)
+        return accounts
+
+    def report_inactive_users_still_have_access(self, db_users_dict, accounts_index=None):
         """ Identify inactive (i.e. not active or transferred) users still have access
         """
         off_board_cnt = 0
-        db_service_users = [v for v in db_users_dict.values() if self.database_attr_name() in v.keys() ]
-        for v in db_service_users:
-            if v[ATTR_STATUS] not in [
-                ATTR_STATUS_ACTIVE,
-                ATTR_STATUS_TRANSFERRED
-            ]:
-                off_board_cnt += 1
-                self.logger.warning("{} user {} should be off boarded".format(
-                    self.database_attr_name(), v[self.database_attr_name()]))
+        for acc_name, user_data_list in self.database_accounts(db_users_dict, accounts_index).items():
+            for v in user_data_list:
+                if v[ATTR_STATUS] not in [
+                    ATTR_STATUS_ACTIVE,
+                    ATTR_STATUS_TRANSFERRED
+                ]:
+                    off_board_cnt += 1
+                    self.logger.warning("{} user {} should be off boarded".format(self.database_attr_name(), acc_name))
         return off_board_cnt
 
     def write_users_to_file(self, users, output_file):
@@ -3,17 +3,31 @@ Define all current supported off/on boarding services
 """
 from __future__ import print_function
 import os
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from nimda.bitbucket.bitbucket_helper import BitbucketHelper
-from nimda.confluence.confluence_helper import ConfluenceHelper
+from nimda.confluence.confluence_helper import ConfluenceHelper, \
+    DEFAULT_CONCURRENCY as CONFLUENCE_CONCURRENCY, DEFAULT_PAGE_SIZE as CONFLUENCE_PAGE_SIZE
 from nimda.dynamodb.dynamodb_helper import DynamoDBHelper
 from nimda.flowdock.flowdock_helper import FlowdockHelper
-from nimda.jenkins.jenkins_helper import JenkinsHelper
-from nimda.jira_client.jira_helper import JiraHelper
+from nimda.jenkins.jenkins_helper import JenkinsHelper, \
+    DEFAULT_CONCURRENCY as JENKINS_CONCURRENCY, DEFAULT_PEOPLE_DEADLINE as JENKINS_PEOPLE_DEADLINE
+from nimda.jira_client.jira_helper import JiraHelper, \
+    DEFAULT_CONCURRENCY as JIRA_CONCURRENCY, DEFAULT_PAGE_SIZE as JIRA_PAGE_SIZE
 from nimda.service_abc import ServiceABC
-from nimda.utils import read_multi_lines_config, write_to_json_file
+from nimda.snapshot import Snapshot
+from nimda.sqlite.sqlite_helper import SQLiteHelper
+from nimda.utils import (
+    DEFAULT_POOL_SIZE,
+    imap_in_thread_pool,
+    read_multi_lines_config,
+    read_optional_config,
+    seconds_since,
+    utc_timestamp,
+    write_to_json_file,
+)
 from nimda import (
+    ATTR_LAST_MODIFIED,
     ATTR_STATUS,
     ATTR_STATUS_ACTIVE,
 )
@@ -24,6 +38,20 @@ from nimda import (
 class UserAccountService(ServiceABC):
     TABLE_NAME = "UserAccounts"
     TABLE_KEY = "gmail"
+    SNAPSHOT_FILE = "UserAccountsSnapshot.json"
+    # Default max number of seconds since the last full scan for refreshing the snapshot incrementally
+    SNAPSHOT_MAX_AGE = 7 * 24 * 60 * 60
+    # Default max number of users updated at a time
+    UPDATE_CONCURRENCY = 8
+
+    def __init__(self, config, logger, attributes=None):
+        """Read configurations from `config`. Only the given `attributes` of the users looked up
+           by `find_users` are read from the database if specified; all attributes otherwise.
+           All users (`users`) are always read with all attributes, as the database summary
+           reports their full records.
+        """
+        self.attributes = attributes
+        ServiceABC.__init__(self, config, logger)
 
     @staticmethod
     def database_attr_name():
@@ -31,40 +59,238 @@ class UserAccountService(ServiceABC):
         """
         return UserAccountService.TABLE_KEY
 
+    @classmethod
+    def attributes_of(cls, services):
+        """Return names of the database attributes used by the given `services`
+        """
+        return [cls.TABLE_KEY, ATTR_STATUS] + [s.database_attr_name() for s in services]
+
     def _init_with_config(self, config):
         """Read configurations from `config`
         """
-        self.profile = config.get("dynamodb", "dynamodb.aws_profile_name")
-        self.app = DynamoDBHelper(self.profile, self.TABLE_NAME, self.TABLE_KEY, self.logger)
+        self.scan_page_size = read_optional_config(config, "dynamodb", "dynamodb.scan_page_size", value_type=int)
+        self.scan_segments = read_optional_config(config, "dynamodb", "dynamodb.scan_segments", 1, int)
+        self.update_concurrency = read_optional_config(
+            config, "storage", "storage.update_concurrency", self.UPDATE_CONCURRENCY, int)
+
+        # Storage of the users' records: `dynamodb` (default) or `sqlite`
+        self.engine = read_optional_config(config, "storage", "storage.engine", "dynamodb")
+        if self.engine == "sqlite":
+            self.sqlite_file = os.path.join(
+                self.output_dir, read_optional_config(config, "storage", "storage.sqlite_file", "UserAccounts.db"))
+            self.app = SQLiteHelper(self.sqlite_file, self.TABLE_NAME, self.TABLE_KEY, self.logger,
+                                    indexed_attrs=[ATTR_STATUS, ATTR_LAST_MODIFIED])
+        else:
+            self.profile = config.get("dynamodb", "dynamodb.aws_profile_name")
+            self.app = DynamoDBHelper(self.profile, self.TABLE_NAME, self.TABLE_KEY, self.logger)
         self.output_file = "DatabaseUserAccountsSummary.json"
 
-        # Retrieve user details the first time
-        self.users = self.all_users(input_dict=None)
+        # Local snapshot of the table (of any storage engine), reused for `storage.snapshot_ttl` seconds
+        self.snapshot_ttl = read_optional_config(config, "storage", "storage.snapshot_ttl", value_type=int)
+        self.snapshot_incremental = read_optional_config(
+            config, "storage", "storage.snapshot_incremental", False, bool)
+        # Max number of seconds since the last full scan for refreshing the snapshot incrementally, so that
+        # records deleted or changed by others (without setting `last_modified`) are eventually read again
+        self.snapshot_max_age = read_optional_config(
+            config, "storage", "storage.snapshot_max_age", self.SNAPSHOT_MAX_AGE, int)
+        self.snapshot = None
+        self.snapshot_timestamp = None
+        self.snapshot_info = None
+        if self.snapshot_ttl is not None:
+            self.snapshot = Snapshot(os.path.join(self.output_dir, self.SNAPSHOT_FILE), self.logger)
+
+        # User details are retrieved on first use of `users`
+        self._users = None
+
+    @property
+    def users(self):
+        """All users in {TABLE_KEY: { attr1: account_name1, etc}}, retrieved the first time it is used
+        """
+        if self._users is None:
+            self._users = self.all_users(input_dict=None)
+        return self._users
+
+    @users.setter
+    def users(self, users):
+        self._users = users
 
     def on_board(self, input_dict):
         """Start on boarding and return True if succeeded; False otherwise
         """
-        return self.app.put_item({
+        user_data = {
             self.TABLE_KEY: input_dict[self.TABLE_KEY],
-            ATTR_STATUS: ATTR_STATUS_ACTIVE
-        })
+            ATTR_STATUS: ATTR_STATUS_ACTIVE,
+            ATTR_LAST_MODIFIED: utc_timestamp()
+        }
+        if self.app.put_item(user_data) is False:
+            return False
+        self.update_snapshot([user_data])
+        return True
 
     def off_board(self, user_data):
         """Update database with the given `user_data` (dict) and return True if
            succeeded; False otherwise
         """
-        return self.app.put_item(user_data)
+        user_data[ATTR_LAST_MODIFIED] = utc_timestamp()
+        if self.app.put_item(user_data) is False:
+            return False
+        self.update_snapshot([user_data])
+        return True
+
+    def update_status(self, username, new_status, removed_attrs, previous_status=None):
+        """Set status of the user of `username` to `new_status` and remove `removed_attrs` from the
+           database record, on condition that the status is still `previous_status` (if given).
+           Return True if succeeded; False otherwise
+        """
+        return self.update_status_many(new_status, {username: (removed_attrs, previous_status)})[username]
+
+    def update_status_many(self, new_status, updates):
+        """Set status of each user of `updates` ({username: (removed_attrs, previous_status)}) to `new_status`
+           and remove `removed_attrs` from the database record, on condition that the status is still
+           `previous_status` (if given); up to `update_concurrency` users at a time.
+           Return an `OrderedDict` of {username: True if succeeded; False otherwise}
+        """
+        timestamp = utc_timestamp()
+
+        def update(username):
+            removed_attrs, previous_status = updates[username]
+            set_dict = {ATTR_STATUS: new_status, ATTR_LAST_MODIFIED: timestamp}
+            expected = {ATTR_STATUS: previous_status} if previous_status is not None else None
+            return username, self.app.update_item(username, set_dict, removed_attrs, expected)
+
+        results = OrderedDict(imap_in_thread_pool(update, list(updates.keys()), self.update_concurrency))
+
+        # Apply the updates to the users retrieved and the snapshot, grouped by the attributes removed
+        updated = OrderedDict()
+        for username, succeeded in results.items():
+            if succeeded is True:
+                updated.setdefault(tuple(updates[username][0]), []).append(
+                    {self.TABLE_KEY: username, ATTR_STATUS: new_status, ATTR_LAST_MODIFIED: timestamp})
+        for removed_attrs, user_data_list in updated.items():
+            self.update_snapshot(user_data_list, list(removed_attrs))
+        return results
+
+    def put_users_many(self, user_data_list):
+        """Write the given `user_data` (dict) list to the database in batches and return
+           a `dict` of {TABLE_KEY: True if succeeded; False otherwise}.
+           The whole records are written unconditionally, overwriting any changes made by others since
+           they were read; off boarding uses `update_status_many` for conditional updates instead.
+        """
+        timestamp = utc_timestamp()
+        for user_data in user_data_list:
+            user_data[ATTR_LAST_MODIFIED] = timestamp
+        results = self.app.batch_put_items(user_data_list)
+        self.update_snapshot([u for u in user_data_list if results.get(u[self.TABLE_KEY]) is True])
+        return results
+
+    def get_user(self, username):
+        """Return the user record of `username` read from database, or None if not found
+        """
+        return self.app.get_item(username, attributes=self.attributes)
+
+    def find_users(self, usernames):
+        """Look up the users of `usernames` in database (in batches) and return
+           ({TABLE_KEY: { attr1: account_name1, etc}} of users found, [usernames not found])
+        """
+        if len(usernames) == 1:
+            user_data = self.get_user(usernames[0])
+            if user_data is None:
+                return {}, list(usernames)
+            return {usernames[0]: user_data}, []
+        return self.app.batch_get_items(usernames, attributes=self.attributes)
 
     def all_users(self, input_dict=None):
-        """Retrieve current user in {TABLE_KEY: { attr1: account_name1, etc}}
+        """Retrieve current user in {TABLE_KEY: { attr1: account_name1, etc}}, from the local
+           snapshot if it is enabled and not older than `snapshot_ttl` seconds.
+           The snapshot is written only after a complete scan, as an error of the scan is raised.
+           Note that the incremental refresh filters the scan by `last_modified`, which reduces only
+           the data transferred; the whole table is still read (and billed) by DynamoDB. The whole
+           table is scanned again once the last full scan is `snapshot_max_age` seconds old.
+        """
+        if self.snapshot is None:
+            return self.scan_users()
+
+        timestamp, items, info = self.snapshot.load()
+        if timestamp is not None and seconds_since(timestamp) < self.snapshot_ttl:
+            self.logger.info("Using snapshot of users read since {}".format(timestamp))
+            self.snapshot_timestamp, self.snapshot_info = timestamp, info
+            return defaultdict(dict, items)
+
+        scan_timestamp = utc_timestamp()
+        full_scan_timestamp = info.get('full_scan_timestamp') if info else None
+        if timestamp is not None and self.snapshot_incremental is True and full_scan_timestamp is not None and \
+                seconds_since(full_scan_timestamp) < self.snapshot_max_age:
+            self.logger.info("Refreshing snapshot with users changed since {} ...".format(timestamp))
+            users = defaultdict(dict, items)
+            users.update(self.scan_users(min_values={ATTR_LAST_MODIFIED: timestamp}))
+        else:
+            users = self.scan_users()
+            full_scan_timestamp = scan_timestamp
+
+        self.snapshot_timestamp, self.snapshot_info = scan_timestamp, {'full_scan_timestamp': full_scan_timestamp}
+        self.snapshot.save(scan_timestamp, users, self.snapshot_info)
+        return users
+
+    def scan_users(self, min_values=None):
+        """Scan database for users (with all attributes) in {TABLE_KEY: { attr1: account_name1, etc}},
+           indexing each page (or segment) of the scan as it arrives
         """
         users = defaultdict(dict)
-        for user_accounts_dict in self.app.all_users():
+        for user_accounts_dict in self.app.all_users(
+                page_size=self.scan_page_size, total_segments=self.scan_segments, min_values=min_values):
             users[user_accounts_dict[self.TABLE_KEY]] = user_accounts_dict
         return users
 
-    def summary(self, db_user_dict=None):
-        """Write latest users' accounts details to json file
+    def index_accounts(self, users, services):
+        """Return {attr: {account_name: [user_record, ...]}} of the accounts of the given `services`
+           of the given `users`. An account name can be of several records (e.g. of a user re-hired),
+           which are all kept.
+        """
+        attrs = [s.database_attr_name() for s in services]
+        accounts_index = dict((attr, defaultdict(list)) for attr in attrs)
+        for user_data in users.values():
+            for attr in attrs:
+                if attr in user_data:
+                    accounts_index[attr][user_data[attr]].append(user_data)
+
+        for attr, accounts in accounts_index.items():
+            for acc_name, user_data_list in accounts.items():
+                if len(user_data_list) > 1:
+                    self.logger.warning("{} user {} is of several users in database: {}".format(
+                        attr, acc_name, ", ".join(u[self.TABLE_KEY] for u in user_data_list)))
+        return accounts_index
+
+    def update_snapshot(self, user_data_list, removed_attrs=None):
+        """Apply the records written to the database to the users retrieved (if any), and to the local
+           snapshot if enabled. The records replace the existing ones; or are merged into them, with
+           `removed_attrs` removed, if `removed_attrs` is given.
+        """
+        if not user_data_list:
+            return
+        if self._users is not None:
+            users, timestamp, info = self._users, self.snapshot_timestamp, self.snapshot_info
+        elif self.snapshot is not None:
+            # Users have not been retrieved in this run, so update the snapshot file directly
+            timestamp, users, info = self.snapshot.load()
+        else:
+            return
+
+        if users is None:
+            return
+        for user_data in user_data_list:
+            username = user_data[self.TABLE_KEY]
+            if removed_attrs is None:
+                users[username] = user_data
+            elif username in users:
+                users[username].update(user_data)
+                for attr in removed_attrs:
+                    users[username].pop(attr, None)
+
+        if self.snapshot is not None and timestamp is not None:
+            self.snapshot.save(timestamp, users, info)
+
+    def summary(self, db_user_dict=None, accounts_index=None):
+        """Write latest users' accounts details (all attributes) to json file
         """
         self.write_users_to_file(self.users, self.output_file)
 
@@ -122,15 +348,13 @@ class BitbucketService(ServiceABC):
                 err_cnt += 1
         return err_cnt==0
 
-    def summary(self, db_users_dict=None):
+    def summary(self, db_users_dict=None, accounts_index=None):
         """Retrieve current user details and compare against the database users' details.
         """
         db_bitbucket_users = None
         if db_users_dict is not None:
             # Find all db users who has bitbucket account
-            db_bitbucket_users = [
-                v[self.database_attr_name()] for v in db_users_dict.values() if self.database_attr_name() in v.keys()
-            ]
+            db_bitbucket_users = self.database_accounts(db_users_dict, accounts_index)
 
         for team_name in self.bitbucket_teams:
             user_list = self.app.current_team_members(team_name)
@@ -146,6 +370,8 @@ class BitbucketService(ServiceABC):
             self.logger.info("{}: Total users not in DB: {}".format(team_name, not_in_db_cnt))
 
     def report_users_not_in_database(self, db_bitbucket_users, user_list, team_name):
+        """Identify bitbucket users not in `db_bitbucket_users` ({account_name: [user_record, ...]})
+        """
         not_in_db_cnt = 0
         if db_bitbucket_users is not None:
             for bb_username in [user["username"] for user in user_list]:
@@ -182,7 +408,10 @@ class JiraService(ServiceABC):
         self.useremail = config.get("jira", "jira.email")
         self.userpass = config.get("jira", "jira.password")
         self.server = config.get("jira", "jira.server")
-        self.app = JiraHelper(self.useremail, self.userpass, self.server, self.logger)
+        self.concurrency = read_optional_config(config, "jira", "jira.concurrency", JIRA_CONCURRENCY, int)
+        self.page_size = read_optional_config(config, "jira", "jira.page_size", JIRA_PAGE_SIZE, int)
+        self.app = JiraHelper(
+            self.useremail, self.userpass, self.server, self.logger, self.concurrency, self.page_size)
         self.output_file = "JiraUsers.csv"
 
     def on_board(self, input_dict):
@@ -199,7 +428,15 @@ class JiraService(ServiceABC):
         self.logger.debug("Off boarding {} user {} ...".format(JiraService.database_attr_name(), username))
         return self.app.remove_all_access(username)
 
-    def summary(self, db_users_dict):
+    def off_board_many(self, user_data_list):
+        """Start off boarding of all users of `user_data_list` in one batch, and return an `OrderedDict` of
+           {user_data: True if succeeded; False otherwise}
+        """
+        self.logger.debug("Off boarding {} users {} ...".format(
+            JiraService.database_attr_name(), ", ".join(user_data_list)))
+        return self.app.remove_all_access_many(user_data_list)
+
+    def summary(self, db_users_dict, accounts_index=None):
         """Retrieve current user details and compare against the database users' details.
         """
         all_users = self.app.members_in_all_groups()
@@ -207,10 +444,10 @@ class JiraService(ServiceABC):
         self.write_users_to_file(all_users, self.output_file)
 
         # Identify inactive users still have jira access
-        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict)
+        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict, accounts_index)
 
         # Identify jira users not in our database
-        db_jira_users = [v for v in db_users_dict.values() if self.database_attr_name() in v.keys() ]
+        db_jira_users = self.database_accounts(db_users_dict, accounts_index)
         not_in_db_cnt = self.report_users_not_in_database(db_jira_users, all_users)
 
         self.logger.info("Summary:")
@@ -219,10 +456,11 @@ class JiraService(ServiceABC):
         self.logger.info("Total users not in DB: {}".format(not_in_db_cnt))
 
     def report_users_not_in_database(self, db_jira_users, all_jira_users):
+        """Identify jira users not in `db_jira_users` ({account_name: [user_record, ...]})
+        """
         not_in_db_cnt = 0
-        db_jira_usernames = [v[self.database_attr_name()] for v in db_jira_users]
         for username in all_jira_users.keys():
-            if username not in db_jira_usernames:
+            if username not in db_jira_users:
                 not_in_db_cnt += 1
                 self.logger.warning("JIRA user {} not in database".format(username))
         return not_in_db_cnt
@@ -244,7 +482,13 @@ class ConfluenceService(ServiceABC):
         self.username = config.get("confluence", "confluence.username")
         self.userpass = config.get("confluence", "confluence.password")
         self.server = config.get("confluence", "confluence.server")
-        self.app = ConfluenceHelper(self.username, self.userpass, self.server, self.logger)
+        self.pool_size = read_optional_config(config, "confluence", "confluence.pool_size", DEFAULT_POOL_SIZE, int)
+        self.page_size = read_optional_config(
+            config, "confluence", "confluence.page_size", CONFLUENCE_PAGE_SIZE, int)
+        self.concurrency = read_optional_config(
+            config, "confluence", "confluence.concurrency", CONFLUENCE_CONCURRENCY, int)
+        self.app = ConfluenceHelper(
+            self.username, self.userpass, self.server, self.logger, self.pool_size, self.page_size, self.concurrency)
         self.output_file = "ConfluenceUsers.csv"
 
     def on_board(self, input_dict):
@@ -261,7 +505,7 @@ class ConfluenceService(ServiceABC):
         self.logger.debug("Off boarding {} user {} ...".format(ConfluenceService.database_attr_name(), username))
         return self.app.remove_all_access(username)
 
-    def summary(self, db_users_dict):
+    def summary(self, db_users_dict, accounts_index=None):
         """Retrieve current user details and compare against the database users' details.
         """
         # Write current users to a file
@@ -269,7 +513,7 @@ class ConfluenceService(ServiceABC):
         self.write_users_to_file(all_users, self.output_file)
 
         # Identify inactive users still have confluence access
-        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict)
+        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict, accounts_index)
 
         self.logger.info("Summary:")
         self.logger.info("Total users: {}".format(len(all_users.keys())))
@@ -280,6 +524,10 @@ class ConfluenceService(ServiceABC):
 # Flowdock
 class FlowdockService(ServiceABC):
 
+    INDEX_FILE = "FlowdockUsersIndex.json"
+    # Default max number of seconds to reuse the local index of users
+    INDEX_TTL = 24 * 60 * 60
+
     @staticmethod
     def database_attr_name():
         """Database attribute name
@@ -293,9 +541,15 @@ class FlowdockService(ServiceABC):
         self.userpass = config.get("flowdock", "flowdock.password")
         self.server = config.get("flowdock", "flowdock.server")
         self.organisation = config.get("flowdock", "flowdock.organisation")
-        self.app = FlowdockHelper(self.email, self.userpass, self.organisation, self.server, self.logger)
+        self.pool_size = read_optional_config(config, "flowdock", "flowdock.pool_size", DEFAULT_POOL_SIZE, int)
+        self.app = FlowdockHelper(self.email, self.userpass, self.organisation, self.server, self.logger,
+                                  self.pool_size)
         self.output_file = "FlowdockUsers.csv"
 
+        # Local index of {email: user id}, rebuilt after `flowdock.index_ttl` seconds
+        self.index_ttl = read_optional_config(config, "flowdock", "flowdock.index_ttl", self.INDEX_TTL, int)
+        self.index = Snapshot(os.path.join(self.output_dir, self.INDEX_FILE), self.logger)
+
     def on_board(self, input_dict):
         """Start on boarding and return True if succeeded; False otherwise
         """
@@ -304,23 +558,103 @@ class FlowdockService(ServiceABC):
         pass
 
     def off_board(self, user_data):
-        """Start off boarding and return True if succeeded; False otherwise
+        """Start off boarding and return True if succeeded; False otherwise.
+           `user_data` can be the user id, or the email of the user.
         """
         user_id = user_data
         self.logger.debug("Off boarding {} user {} ...".format(FlowdockService.database_attr_name(), user_data))
-        return self.app.remove_user_from_organisation(user_id)
-
-    def summary(self, db_users_dict):
+        if '@' in str(user_data):
+            user_id = self.user_id(user_data)
+            if user_id is None:
+                self.logger.error("Flowdock user {} not found".format(user_data))
+                return False
+
+        if self.app.remove_user_from_organisation(user_id) is False:
+            return False
+        self.remove_from_index(user_id)
+        return True
+
+    def account_names(self, user_records):
+        """Return an `OrderedDict` of {username: Flowdock user id} of the users of `user_records`.
+           Users without a Flowdock id in their records are looked up by their email in the local index,
+           so their Flowdock accounts are off boarded as well.
+        """
+        attr = self.database_attr_name()
+        emails = OrderedDict(
+            (username, self.user_email(v)) for username, v in user_records.items() if attr not in v.keys())
+        users_ids = self.users_ids(emails.values()) if emails else {}
+
+        acc_names = OrderedDict()
+        for username, v in user_records.items():
+            if attr in v.keys():
+                acc_names[username] = v[attr]
+            elif emails[username] in users_ids:
+                self.logger.info("Flowdock user {} found by email {}".format(username, emails[username]))
+                acc_names[username] = users_ids[emails[username]]
+        return acc_names
+
+    def user_email(self, user_record):
+        """Return email of the user of a database record
+        """
+        return '{}@{}.com'.format(user_record[UserAccountService.TABLE_KEY], self.organisation)
+
+    def user_id(self, email):
+        """Return id of the user of `email`, or None if not found
+        """
+        return self.users_ids([email]).get(email)
+
+    def users_ids(self, emails):
+        """Return {email: user id} of the users found of `emails`, looked up in the local index.
+           The index is rebuilt from all users once expired, so it is complete until then: users not
+           indexed are not found, without reading all users again.
+        """
+        timestamp, index, _ = self.index.load()
+        if timestamp is None or seconds_since(timestamp) >= self.index_ttl:
+            index = self.rebuild_index(self.app.iter_users())
+        return dict((email, int(index[email])) for email in emails if email in index)
+
+    def rebuild_index(self, users):
+        """Rebuild the local index from all `users`, and return it. The index is not written if no
+           users are read (e.g. failed to retrieve them).
+        """
+        timestamp, index = utc_timestamp(), {}
+        for user in users:
+            index[user['email']] = user['id']
+        if index:
+            self.index.save(timestamp, index)
+        return index
+
+    def remove_from_index(self, user_id):
+        """Remove the user of `user_id` from the local index
+        """
+        timestamp, index, _ = self.index.load()
+        if index is None:
+            return
+        emails = [email for email, indexed_id in index.items() if int(indexed_id) == int(user_id)]
+        for email in emails:
+            del index[email]
+        if emails:
+            self.index.save(timestamp, index)
+
+    def summary(self, db_users_dict, accounts_index=None):
         """Retrieve current user details and compare against the database users' details.
+           The local index of users is rebuilt from all users read.
         """
         # Write current users to a file
-        db_users_emails = ['{}@{}.com'.format(
-            v[UserAccountService.TABLE_KEY], self.organisation) for v in db_users_dict.values()]
-        all_users = self.app.users(db_users_emails)
+        db_users_emails = set(self.user_email(v) for v in db_users_dict.values())
+        all_users = []
+
+        def users_read():
+            for user in self.app.iter_users():
+                if user['email'] in db_users_emails:
+                    all_users.append(user)
+                yield user
+
+        self.rebuild_index(users_read())
         self.write_users_to_file(all_users, self.output_file)
 
         # Identify inactive users still have flowdock access
-        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict)
+        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict, accounts_index)
 
         self.logger.info("Summary:")
         self.logger.info("Total users: {}".format(len(all_users)))
@@ -343,7 +677,16 @@ class JenkinsService(ServiceABC):
         self.username = config.get("jenkins", "jenkins.username")
         self.userpass = config.get("jenkins", "jenkins.password")
         self.server = config.get("jenkins", "jenkins.server")
-        self.app = JenkinsHelper(self.username, self.userpass, self.server, self.logger)
+        self.pool_size = read_optional_config(config, "jenkins", "jenkins.pool_size", DEFAULT_POOL_SIZE, int)
+        self.concurrency = read_optional_config(
+            config, "jenkins", "jenkins.concurrency", JENKINS_CONCURRENCY, int)
+        self.timeout = read_optional_config(config, "jenkins", "jenkins.timeout", None, float)
+        self.people_deadline = read_optional_config(
+            config, "jenkins", "jenkins.people_deadline", JENKINS_PEOPLE_DEADLINE, float)
+        self.script_console = read_optional_config(config, "jenkins", "jenkins.script_console", False, bool)
+        self.app = JenkinsHelper(
+            self.username, self.userpass, self.server, self.logger, self.pool_size, self.concurrency, self.timeout,
+            self.people_deadline, self.script_console)
         self.output_file = "JenkinsUsers.csv"
 
     def on_board(self, input_dict):
@@ -360,7 +703,7 @@ class JenkinsService(ServiceABC):
         self.logger.debug("Off boarding {} user {} ...".format(JenkinsService.database_attr_name(), user_data))
         return self.app.remove_user(user_id)
 
-    def summary(self, db_users_dict):
+    def summary(self, db_users_dict, accounts_index=None):
         """Retrieve current user details and compare against the database users' details.
         """
         # Write current users to a file
@@ -368,8 +711,9 @@ class JenkinsService(ServiceABC):
         self.write_users_to_file(all_users, self.output_file)
 
         # Identify inactive users still have jenkins access
-        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict)
+        off_board_cnt = self.report_inactive_users_still_have_access(db_users_dict, accounts_index)
 
         self.logger.info("Summary:")
         self.logger.info("Total users: {}".format(len(all_users)))
+        self.logger.info("Total users of unknown status: {}".format(len(self.app.unknown_users_ids)))
         self.logger.info("Total users should be off boarded: {}".format(off_board_cnt))
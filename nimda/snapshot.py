@@ -0,0 +1,55 @@
+"""
+Local snapshot of items (e.g. the records of a database table, or the users of a service),
+for reusing them across runs instead of reading them all again.
+"""
+from __future__ import print_function
+from decimal import Decimal
+import json
+import os
+import tempfile
+
+from nimda.utils import decimal_to_number
+
+
+# Atomically replace a file (on python 2, `os.rename` does so on POSIX only)
+replace_file = getattr(os, 'replace', os.rename)
+
+
+class Snapshot(object):
+
+    def __init__(self, filename, logger):
+        self.filename = filename
+        self.logger = logger
+
+    def load(self):
+        """Return (timestamp, items, info) of the snapshot, where `items` is a `dict` of {key: item}
+           and `info` a `dict` of details saved with the items (e.g. how they were read);
+           or (None, None, None) if there is no valid snapshot
+        """
+        if not os.path.exists(self.filename):
+            return None, None, None
+        try:
+            with open(self.filename) as infile:
+                # Numbers are read back as Decimal, same as from DynamoDB
+                data = json.load(infile, parse_float=Decimal, parse_int=Decimal)
+            return data['timestamp'], data['items'], data.get('info') or {}
+        except Exception as e:
+            self.logger.error("Ignoring invalid snapshot {}: {}".format(self.filename, e))
+        return None, None, None
+
+    def save(self, timestamp, items, info=None):
+        """Write `items` (`dict` of {key: item}) read since `timestamp`, with the details in `info` (`dict`)
+        """
+        self.logger.debug("Writing snapshot {} ...".format(self.filename))
+        # Written to a file of its own, so that concurrent runs do not write to the same file
+        fd, tmp_filename = tempfile.mkstemp(
+            prefix=os.path.basename(self.filename) + '.', suffix='.tmp', dir=os.path.dirname(self.filename) or '.')
+        try:
+            with os.fdopen(fd, "w") as outfile:
+                json.dump({'timestamp': timestamp, 'items': items, 'info': info or {}}, outfile,
+                          default=decimal_to_number)
+            # Replace the old snapshot only once the new one is complete
+            replace_file(tmp_filename, self.filename)
+        except Exception:
+            os.remove(tmp_filename)
+            raise
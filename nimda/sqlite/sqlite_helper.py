@@ -0,0 +1,177 @@
+"""
+SQLite helper implements a local storage of the user accounts' records, with the
+same interface as the DynamoDB helper, for running nimda without AWS access.
+
+Each item is stored as json, together with the key and the indexed attributes
+in their own (indexed) columns for filtering.
+"""
+from __future__ import print_function
+from collections import OrderedDict
+from decimal import Decimal
+import json
+import sqlite3
+import threading
+
+from nimda.storage_abc import StorageABC
+from nimda.utils import decimal_to_number
+
+
+# Max number of keys in a SELECT ... IN (...) query, below the SQLite limit of variables
+BATCH_GET_SIZE = 500
+
+# Default number of rows fetched at a time when reading all items
+DEFAULT_PAGE_SIZE = 1000
+
+
+class SQLiteHelper(StorageABC):
+    def __init__(self, filename, users_table_name, users_table_key, logger, indexed_attrs=None):
+        self.logger = logger
+        self.table_name = users_table_name
+        self.table_key = users_table_key
+        self.indexed_attrs = list(indexed_attrs or [])
+
+        # The connection is shared between threads, so access to it is serialised
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.create_table()
+
+    def create_table(self):
+        """Create the table (and the indexes of the indexed attributes) if not exist
+        """
+        columns = ['"{}" TEXT PRIMARY KEY'.format(self.table_key), 'item TEXT NOT NULL']
+        columns.extend('"{}"'.format(attr) for attr in self.indexed_attrs)
+        with self.lock, self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(self.table_name, ', '.join(columns)))
+            for attr in self.indexed_attrs:
+                self.connection.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(
+                    self.table_name, attr))
+
+    @staticmethod
+    def dumps(item):
+        return json.dumps(item, sort_keys=True, default=decimal_to_number)
+
+    @staticmethod
+    def loads(data, attributes=None):
+        # Numbers are read as Decimal, same as from DynamoDB
+        item = json.loads(data, parse_float=Decimal, parse_int=Decimal)
+        if attributes:
+            return dict((k, v) for k, v in item.items() if k in attributes)
+        return item
+
+    def row(self, item):
+        """Return values of the row of the given item
+        """
+        values = [item.get(attr) for attr in self.indexed_attrs]
+        return [item[self.table_key], self.dumps(item)] + [
+            decimal_to_number(v) if isinstance(v, Decimal) else v for v in values
+        ]
+
+    def user_exists(self, user_main_account):
+        """Return True if `user_main_account` does exist in the database; False otherwise.
+        """
+        return self.get_item(user_main_account) is not None
+
+    def get_item(self, key, attributes=None):
+        """Return the item of `key`, or None if not found. Only the given `attributes`
+           are returned if specified.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT item FROM "{}" WHERE "{}" = ?'.format(self.table_name, self.table_key), (key,)
+            ).fetchone()
+        return self.loads(row[0], attributes) if row is not None else None
+
+    def batch_get_items(self, keys, attributes=None):
+        """Return ({key: item} of the items found, [keys not found]). Only the given
+           `attributes` are returned if specified.
+        """
+        # Look up each key once, in the given order
+        keys = list(OrderedDict.fromkeys(keys))
+        found = {}
+        for i in range(0, len(keys), BATCH_GET_SIZE):
+            chunk = keys[i:i + BATCH_GET_SIZE]
+            with self.lock:
+                rows = self.connection.execute('SELECT "{}", item FROM "{}" WHERE "{}" IN ({})'.format(
+                    self.table_key, self.table_name, self.table_key, ', '.join('?' * len(chunk))), chunk
+                ).fetchall()
+            for key, data in rows:
+                found[key] = self.loads(data, attributes)
+        return found, [k for k in keys if k not in found]
+
+    def put_item(self, input_dict):
+        """Put item (add new or override existing item) into the database
+        """
+        return self.batch_put_items([input_dict])[input_dict[self.table_key]]
+
+    def batch_put_items(self, input_dicts):
+        """Put items (add new or override existing items) into the database in one transaction.
+           Return a `dict` of {key: True if succeeded; False otherwise}
+        """
+        rows = [self.row(item) for item in input_dicts]
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany('INSERT OR REPLACE INTO "{}" VALUES ({})'.format(
+                    self.table_name, ', '.join('?' * (2 + len(self.indexed_attrs)))), rows)
+            succeeded = True
+        except sqlite3.Error as e:
+            self.logger.error(e)
+            succeeded = False
+        return dict((row[0], succeeded) for row in rows)
+
+    def update_item(self, key, set_dict, remove_attrs=None, expected_dict=None):
+        """Update only the given attributes of the item of `key`: set attributes in `set_dict`,
+           remove attributes in `remove_attrs`, on condition that the current values of the item
+           are the ones in `expected_dict`. Return True if succeeded; False otherwise
+        """
+        try:
+            with self.lock, self.connection:
+                row = self.connection.execute(
+                    'SELECT item FROM "{}" WHERE "{}" = ?'.format(self.table_name, self.table_key), (key,)
+                ).fetchone()
+                item = self.loads(row[0]) if row is not None else {self.table_key: key}
+                if any(item.get(attr) != value for attr, value in (expected_dict or {}).items()):
+                    self.logger.error("{} has been changed by others (expected {})".format(key, expected_dict))
+                    return False
+                item.update(set_dict)
+                for attr in remove_attrs or []:
+                    item.pop(attr, None)
+                self.connection.execute('INSERT OR REPLACE INTO "{}" VALUES ({})'.format(
+                    self.table_name, ', '.join('?' * (2 + len(self.indexed_attrs)))), self.row(item))
+        except sqlite3.Error as e:
+            self.logger.error(e)
+            return False
+        return True
+
+    def all_users(self, page_size=None, total_segments=1, min_values=None, attributes=None):
+        """Yield user accounts (dict) page by page, as they are read from the database.
+           `total_segments` is ignored as the database is local.
+           If `min_values` (dict) is given, only the items having attributes not less
+           than these values are returned; filtered by the query if the attributes are indexed.
+           If `attributes` (list) is given, only these attributes of the items are returned.
+        """
+        min_values = min_values or {}
+        indexed = [attr for attr in min_values.keys() if attr in self.indexed_attrs]
+        not_indexed = [attr for attr in min_values.keys() if attr not in self.indexed_attrs]
+
+        query = 'SELECT item FROM "{}"'.format(self.table_name)
+        if indexed:
+            query += ' WHERE ' + ' AND '.join('"{}" >= ?'.format(attr) for attr in indexed)
+
+        # Rows are fetched a page at a time, so the lock is held per page only
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute(query, [min_values[attr] for attr in indexed])
+        try:
+            while True:
+                with self.lock:
+                    rows = cursor.fetchmany(page_size or DEFAULT_PAGE_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    item = self.loads(row[0])
+                    if all(attr in item and item[attr] >= min_values[attr] for attr in not_indexed):
+                        yield dict((k, v) for k, v in item.items() if k in attributes) if attributes else item
+        except sqlite3.Error as e:
+            self.logger.error(e)
+        finally:
+            cursor.close()
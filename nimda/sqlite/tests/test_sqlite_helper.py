@@ -0,0 +1,80 @@
+import logging
+from decimal import Decimal
+
+from nimda.sqlite.sqlite_helper import SQLiteHelper
+
+
+test_logger = logging.getLogger(__file__)
+test_logger.addHandler(logging.StreamHandler())
+
+
+def create_helper():
+    return SQLiteHelper(
+        filename=":memory:",
+        users_table_name="sample_users",
+        users_table_key="gmail",
+        logger=test_logger,
+        indexed_attrs=["status", "last_modified"]
+    )
+
+
+def test_sqlite_helper_put_and_get():
+    """Test SQLiteHelper put_item, batch_put_items, get_item, batch_get_items and user_exists
+    """
+    helper = create_helper()
+
+    assert helper.put_item({"gmail": "user1", "status": "active", "flowdock": Decimal(1111)}) is True
+    assert helper.batch_put_items([
+        {"gmail": "user2", "status": "active"},
+        {"gmail": "user3", "status": "suspended"},
+    ]) == {"user2": True, "user3": True}
+
+    assert helper.user_exists("user1") is True
+    assert helper.user_exists("user4") is False
+
+    ret = helper.get_item("user1")
+    assert ret == {"gmail": "user1", "status": "active", "flowdock": Decimal(1111)}
+    assert helper.get_item("user1", attributes=["gmail", "status"]) == {"gmail": "user1", "status": "active"}
+    assert helper.get_item("user4") is None
+
+    found, missing = helper.batch_get_items(["user1", "user3", "user4", "user1"])
+    assert sorted(found.keys()) == ["user1", "user3"]
+    assert missing == ["user4"]
+
+    # Keys not found are returned in the given order
+    found, missing = helper.batch_get_items(["user9", "user4", "user1", "user7", "user5", "user6", "user8"])
+    assert missing == ["user9", "user4", "user7", "user5", "user6", "user8"]
+
+
+def test_sqlite_helper_update_item():
+    """Test SQLiteHelper update_item sets and removes attributes on condition
+    """
+    helper = create_helper()
+    helper.put_item({"gmail": "user1", "status": "active", "jira": "user1", "jenkins": "user1"})
+
+    assert helper.update_item("user1", {"status": "suspended"}, ["jira"], {"status": "active"}) is True
+    assert helper.get_item("user1") == {"gmail": "user1", "status": "suspended", "jenkins": "user1"}
+
+    # Status has been changed by others
+    assert helper.update_item("user1", {"status": "suspended"}, ["jenkins"], {"status": "active"}) is False
+    assert helper.get_item("user1")["jenkins"] == "user1"
+
+
+def test_sqlite_helper_all_users():
+    """Test SQLiteHelper all_users with page size, filter and projection
+    """
+    helper = create_helper()
+    helper.batch_put_items([
+        {"gmail": "user{}".format(i), "status": "active", "last_modified": "2017-02-1{}".format(i), "jira": "j"}
+        for i in range(5)
+    ])
+
+    assert len(list(helper.all_users(page_size=2))) == 5
+
+    ret = list(helper.all_users(min_values={"last_modified": "2017-02-13"}, attributes=["gmail", "status"]))
+    assert sorted(u["gmail"] for u in ret) == ["user3", "user4"]
+    assert all(sorted(u.keys()) == ["gmail", "status"] for u in ret)
+
+    # Filter on attributes not indexed
+    ret = list(helper.all_users(min_values={"jira": "k"}))
+    assert len(ret) == 0
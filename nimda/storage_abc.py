@@ -0,0 +1,60 @@
+"""
+Define abstract class for implementing supported storages of the user accounts' records.
+"""
+import abc
+import six
+
+
+@six.add_metaclass(abc.ABCMeta)
+class StorageABC():
+
+    @abc.abstractmethod
+    def user_exists(self, user_main_account):
+        """Return True if `user_main_account` does exist in the storage; False otherwise.
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_item(self, key, attributes=None):
+        """Return the item of `key`, or None if not found. Only the given `attributes`
+           are returned if specified.
+        """
+        pass
+
+    @abc.abstractmethod
+    def batch_get_items(self, keys, attributes=None):
+        """Return ({key: item} of the items found, [keys not found]). Only the given
+           `attributes` are returned if specified.
+        """
+        pass
+
+    @abc.abstractmethod
+    def put_item(self, input_dict):
+        """Put item (add new or override existing item) into the storage.
+           Return True if succeeded; False otherwise
+        """
+        pass
+
+    @abc.abstractmethod
+    def batch_put_items(self, input_dicts):
+        """Put items (add new or override existing items) into the storage.
+           Return a `dict` of {key: True if succeeded; False otherwise}
+        """
+        pass
+
+    @abc.abstractmethod
+    def update_item(self, key, set_dict, remove_attrs=None, expected_dict=None):
+        """Update only the given attributes of the item of `key`: set attributes in `set_dict`,
+           remove attributes in `remove_attrs`, on condition that the current values of the item
+           are the ones in `expected_dict`. Return True if succeeded; False otherwise
+        """
+        pass
+
+    @abc.abstractmethod
+    def all_users(self, page_size=None, total_segments=1, min_values=None, attributes=None):
+        """Yield user accounts (dict) page by page, as they are read from the storage.
+           If `min_values` (dict) is given, only the items having attributes not less
+           than these values are returned.
+           If `attributes` (list) is given, only these attributes of the items are returned.
+        """
+        pass
@@ -67,6 +67,9 @@ def test_confluence_service_off_board(default_testing_config, unit_tests_tmp_dir
         )
         assert service.off_board("user1") is False
 
+        # Users off boarded in a batch are off boarded one by one
+        assert list(service.off_board_many(["user1"]).items()) == [("user1", False)]
+
 
 def test_confluence_service_summary(default_testing_config, unit_tests_tmp_dir):
     """Test ConfluenceService summary
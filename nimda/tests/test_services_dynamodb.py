@@ -2,30 +2,45 @@
 Tests butler.services useraccounts (dynamodb)
 """
 import boto3
+import json
+from botocore.exceptions import ClientError
+import mock
 from mock import Mock
+import py.test
+from os import remove
 from os.path import exists, join
+from six.moves.configparser import RawConfigParser
 
 from nimda.services import (
     UserAccountService,
+    BitbucketService,
     DynamoDBHelper,
+    JiraService,
+    JenkinsService,
 )
 from nimda.dynamodb.tests.test_dynamodb_helper import (
     SAMPLE_QUERY_OK,
     SAMPLE_SCAN_OK,
     SAMPLE_UPDATE_STATUS_OK
 )
+from nimda.sqlite.sqlite_helper import SQLiteHelper
 from nimda.tests.conftest import logger
 
 
+def mock_create_client():
+    """Patch `DynamoDBHelper.create_client` (for the duration of a test) to return a resource of the default profile
+    """
+    return mock.patch.object(DynamoDBHelper, 'create_client', Mock(
+        return_value=boto3.resource('dynamodb', region_name='ap-southeast-2')
+    ))
+
+
+@mock_create_client()
 def test_dynamodb_service_init(default_testing_config):
     """Test UserAccountService database_attr_name and _init_with_config
     """
     assert UserAccountService.database_attr_name() == 'gmail'
 
-    DynamoDBHelper.create_client = Mock(
-        return_value=boto3.resource('dynamodb', region_name='ap-southeast-2')
-    )
-
     service = UserAccountService(default_testing_config, logger)
 
     service.app.all_users = Mock(return_value=[
@@ -37,13 +52,77 @@ def test_dynamodb_service_init(default_testing_config):
     assert len(service.all_users().keys()) == 2
 
 
+@mock_create_client()
+def test_dynamodb_service_lazy_users(default_testing_config):
+    """Test UserAccountService retrieves all users only when they are used
+    """
+    service = UserAccountService(default_testing_config, logger)
+    service.app.all_users = Mock(return_value=[
+        {'gmail': 'user1', 'status': 'active', 'jira': 'jira1'},
+    ])
+    service.app.table.get_item = Mock(return_value={'Item': {'gmail': 'user1', 'status': 'active'}})
+
+    # Looking up a user reads only the user's record
+    assert service.find_users(['user1']) == ({'user1': {'gmail': 'user1', 'status': 'active'}}, [])
+    service.app.table.get_item.assert_called_with(Key={'gmail': 'user1'})
+    assert service.app.all_users.call_count == 0
+
+    service.app.table.get_item = Mock(return_value={})
+    assert service.find_users(['user2']) == ({}, ['user2'])
+
+    # All users are retrieved once, on first use
+    assert service.index_accounts(service.users, [JiraService])['jira']['jira1'][0]['gmail'] == 'user1'
+    assert len(service.users.keys()) == 1
+    assert service.app.all_users.call_count == 1
+
+
+@mock_create_client()
+def test_dynamodb_service_index_accounts(default_testing_config):
+    """Test UserAccountService index_accounts
+    """
+    service = UserAccountService(default_testing_config, logger)
+
+    users = {
+        'user1': {'gmail': 'user1', 'status': 'active', 'jira': 'jira1', 'bitbucket': 'bb1', 'phone': '0400'},
+        'user2': {'gmail': 'user2', 'status': 'suspended', 'jira': 'jira2', 'tags': ['a', 'b']},
+        # Re-hired user2
+        'user3': {'gmail': 'user3', 'status': 'active', 'jira': 'jira2'},
+    }
+    ret = service.index_accounts(users, [JiraService, BitbucketService, JenkinsService])
+
+    # Only the accounts of the services are indexed
+    assert sorted(ret.keys()) == ['bitbucket', 'jenkins', 'jira']
+    assert ret['jira']['jira1'] == [users['user1']]
+    assert ret['bitbucket'] == {'bb1': [users['user1']]}
+    assert ret['jenkins'] == {}
+
+    # All records of an account are kept
+    assert sorted(u['gmail'] for u in ret['jira']['jira2']) == ['user2', 'user3']
+    assert JiraService(default_testing_config, logger).report_inactive_users_still_have_access(users, ret) == 1
+
+
+@mock_create_client()
+def test_dynamodb_service_attributes(default_testing_config):
+    """Test UserAccountService looks up users with only the attributes used by the given services
+    """
+    attributes = UserAccountService.attributes_of([JiraService, JenkinsService])
+    assert attributes == ['gmail', 'status', 'jira', 'jenkins']
+
+    service = UserAccountService(default_testing_config, logger, attributes=attributes)
+    service.app.batch_get_items = Mock(return_value=({'user1': {'gmail': 'user1', 'status': 'active'}}, []))
+    service.find_users(['user1', 'user2'])
+    assert service.app.batch_get_items.call_args[1]['attributes'] == attributes
+
+    # All users are read with all attributes
+    service.app.all_users = Mock(return_value=[{'gmail': 'user1', 'status': 'active', 'jira': 'user1'}])
+    assert len(service.all_users().keys()) == 1
+    assert 'attributes' not in service.app.all_users.call_args[1]
+
+
+@mock_create_client()
 def test_dynamodb_service_off_board(default_testing_config, unit_tests_tmp_dir):
     """Test UserAccountService off_board
     """
-    DynamoDBHelper.create_client = Mock(
-        return_value=boto3.resource('dynamodb', region_name='ap-southeast-2')
-    )
-
     service = UserAccountService(default_testing_config, logger)
 
     # Mock functions' outputs
@@ -53,14 +132,25 @@ def test_dynamodb_service_off_board(default_testing_config, unit_tests_tmp_dir):
 
     assert service.off_board(user_data={"gmail": "hello", "status": "suspended"}) is True
 
+    service.app.table.meta.client.update_item = Mock(return_value=SAMPLE_UPDATE_STATUS_OK)
+    assert service.update_status("hello", "suspended", ["jira"], "active") is True
+
+    service.app.table.meta.client.batch_get_item = Mock(return_value={
+        'Responses': {'UserAccounts': [{"gmail": "hello", "status": "active"}]}
+    })
+    assert service.find_users(["hello", "world"]) == ({"hello": {"gmail": "hello", "status": "active"}}, ["world"])
+
+    service.app.table.meta.client.batch_write_item = Mock(return_value={'UnprocessedItems': {}})
+    assert service.put_users_many(user_data_list=[
+        {"gmail": "hello", "status": "suspended"},
+        {"gmail": "world", "status": "suspended"}
+    ]) == {"hello": True, "world": True}
 
+
+@mock_create_client()
 def test_dynamodb_service_summary(default_testing_config, unit_tests_tmp_dir):
     """Test UserAccountService summary
     """
-    DynamoDBHelper.create_client = Mock(
-        return_value=boto3.resource('dynamodb', region_name='ap-southeast-2')
-    )
-
     service = UserAccountService(default_testing_config, logger)
 
     # Mock functions' outputs
@@ -73,3 +163,134 @@ def test_dynamodb_service_summary(default_testing_config, unit_tests_tmp_dir):
     service.summary()
 
     assert exists(join(unit_tests_tmp_dir, service.output_file))
+
+
+@mock_create_client()
+def test_dynamodb_service_summary_contents(default_testing_config, unit_tests_tmp_dir):
+    """Test UserAccountService summary writes all attributes of the users, even if the service looks up
+       users with only some attributes
+    """
+    full_records = [
+        {'gmail': 'user1', 'status': 'active', 'jira': 'user1', 'fullname': 'User 1', 'phone': '0400000001'},
+        {'gmail': 'user2', 'status': 'suspended', 'fullname': 'User 2'},
+    ]
+
+    for attributes in [None, UserAccountService.attributes_of([JiraService])]:
+        service = UserAccountService(default_testing_config, logger, attributes=attributes)
+
+        def all_users(**kwargs):
+            attrs = kwargs.get('attributes')
+            return [dict((k, v) for k, v in u.items() if attrs is None or k in attrs) for u in full_records]
+        service.app.all_users = Mock(side_effect=all_users)
+
+        service.summary()
+
+        with open(join(unit_tests_tmp_dir, service.output_file)) as infile:
+            assert json.load(infile) == dict((u['gmail'], u) for u in full_records)
+
+
+@mock_create_client()
+@mock.patch.object(DynamoDBHelper, 'all_users')
+def test_dynamodb_service_snapshot(all_users, default_testing_ini, unit_tests_tmp_dir):
+    """Test UserAccountService reads users from the local snapshot, and refreshes it incrementally
+    """
+    all_users.configure_mock(return_value=[
+        {'gmail': 'user1', 'status': 'active', 'last_modified': '2017-02-10T10:49:05.000000Z'},
+        {'gmail': 'user2', 'status': 'active', 'last_modified': '2017-02-10T10:49:05.000000Z'},
+    ])
+
+    config = RawConfigParser()
+    config.read(default_testing_ini)
+    config.add_section('storage')
+    config.set('storage', 'storage.snapshot_ttl', '3600')
+    config.set('storage', 'storage.snapshot_incremental', 'true')
+
+    # First run scans the table and writes the snapshot
+    service = UserAccountService(config, logger)
+    assert len(service.users.keys()) == 2
+    assert exists(join(unit_tests_tmp_dir, service.SNAPSHOT_FILE))
+    assert all_users.call_count == 1
+
+    # Records written by the service should also be written to the snapshot
+    service.app.put_item = Mock(return_value=True)
+    assert service.off_board({'gmail': 'user2', 'status': 'suspended'}) is True
+
+    # Next run within the ttl reads the snapshot only
+    service = UserAccountService(config, logger)
+    assert all_users.call_count == 1
+    assert service.users['user2']['status'] == 'suspended'
+    assert 'last_modified' in service.users['user2']
+
+    # Records updated without retrieving all users should also be written to the snapshot
+    service = UserAccountService(config, logger)
+    service.app.update_item = Mock(return_value=True)
+    assert service.update_status('user1', 'suspended', ['jira'], 'active') is True
+    assert service._users is None
+    service = UserAccountService(config, logger)
+    assert service.users['user1']['status'] == 'suspended'
+    assert all_users.call_count == 1
+
+    # So is a service looking up users with only some attributes
+    service = UserAccountService(config, logger, attributes=['gmail', 'status'])
+    assert all_users.call_count == 1
+
+    # After the ttl, only the users changed since the snapshot are scanned
+    config.set('storage', 'storage.snapshot_ttl', '0')
+    all_users.configure_mock(return_value=[{'gmail': 'user3', 'status': 'active'}])
+    service = UserAccountService(config, logger)
+    assert len(service.users.keys()) == 3
+    assert 'min_values' in all_users.call_args[1]
+    assert all_users.call_args[1]['min_values']['last_modified']
+
+    # The whole table is scanned again once the last full scan is too old
+    config.set('storage', 'storage.snapshot_max_age', '0')
+    all_users.configure_mock(return_value=[{'gmail': 'user3', 'status': 'active'}])
+    service = UserAccountService(config, logger)
+    assert list(service.users.keys()) == ['user3']
+    assert all_users.call_args[1]['min_values'] is None
+
+    remove(join(unit_tests_tmp_dir, service.SNAPSHOT_FILE))
+
+    # A snapshot is not written if the scan is not completed
+    def incomplete_scan(**kwargs):
+        yield {'gmail': 'user1', 'status': 'active'}
+        raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': ''}}, 'Scan')
+    all_users.configure_mock(side_effect=incomplete_scan)
+    service = UserAccountService(config, logger)
+    with py.test.raises(ClientError):
+        service.users
+    assert not exists(join(unit_tests_tmp_dir, service.SNAPSHOT_FILE))
+
+
+def test_dynamodb_service_sqlite_storage(default_testing_ini, unit_tests_tmp_dir):
+    """Test UserAccountService with the sqlite storage
+    """
+    config = RawConfigParser()
+    config.read(default_testing_ini)
+    config.add_section('storage')
+    config.set('storage', 'storage.engine', 'sqlite')
+
+    service = UserAccountService(config, logger)
+    assert isinstance(service.app, SQLiteHelper)
+    assert exists(join(unit_tests_tmp_dir, 'UserAccounts.db'))
+
+    assert service.on_board({'gmail': 'user1'}) is True
+    assert service.on_board({'gmail': 'user2'}) is True
+    assert service.update_status('user1', 'suspended', [], 'active') is True
+    assert service.find_users(['user1', 'user3']) == (
+        {'user1': service.get_user('user1')}, ['user3'])
+    assert service.users['user1']['status'] == 'suspended'
+    assert service.users['user2']['status'] == 'active'
+
+    # Users are updated one by one on condition that their status has not been changed by others
+    assert service.on_board({'gmail': 'user3'}) is True
+    results = service.update_status_many('transferred', {
+        'user2': ([], 'active'),
+        'user3': ([], 'suspended'),
+    })
+    assert list(results.items()) == [('user2', True), ('user3', False)]
+    assert service.get_user('user2')['status'] == 'transferred'
+    assert service.get_user('user3')['status'] == 'active'
+    assert service.users['user2']['status'] == 'transferred'
+
+    remove(join(unit_tests_tmp_dir, 'UserAccounts.db'))
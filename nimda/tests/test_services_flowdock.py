@@ -1,6 +1,7 @@
 """
 Tests butler.services flowdock
 """
+import os
 import requests_mock
 from os.path import exists, join
 
@@ -50,6 +51,54 @@ def test_flowdock_service_off_board(default_testing_config, unit_tests_tmp_dir):
         assert service.off_board(2222) is False
 
 
+def test_flowdock_service_off_board_by_email(default_testing_config, unit_tests_tmp_dir):
+    """Test FlowdockService off_board looks up id of the user of an email in the local index
+    """
+    with requests_mock.mock() as mock_adapter:
+        service = FlowdockService(default_testing_config, logger)
+        TEST_SERVER = service.server
+        TEST_ORGANISATION = service.organisation
+        if exists(service.index.filename):
+            os.remove(service.index.filename)
+
+        mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url,
+            status_code=200,
+            json=[
+                {"email": "user1@example.com", "id": 1111},
+                {"email": "user2@example.com", "id": 2222},
+                {"email": "user3@example.com", "id": 3333},
+            ]
+        )
+        for user_id in [1111, 2222, 3333]:
+            mock_adapter.delete(
+                DEFS.delete_user_from_organisation(TEST_SERVER, TEST_ORGANISATION, user_id).service_url,
+                status_code=200
+            )
+
+        # All users are read and indexed
+        assert service.user_id("user2@example.com") == 2222
+        timestamp, index, _ = service.index.load()
+        assert index == {"user1@example.com": 1111, "user2@example.com": 2222, "user3@example.com": 3333}
+        assert mock_adapter.call_count == 1
+
+        # Indexed users are looked up locally
+        assert service.off_board("user1@example.com") is True
+        assert service.off_board("user3@example.com") is True
+        assert mock_adapter.call_count == 3
+        assert sorted(service.index.load()[1].keys()) == ["user2@example.com"]
+        assert service.index.load()[0] == timestamp
+
+        # So are users not found, without reading all users again
+        assert service.off_board("user4@example.com") is False
+        assert service.off_board("user4@example.com") is False
+        assert mock_adapter.call_count == 3
+
+        # The index is rebuilt once expired
+        service.index_ttl = 0
+        assert service.user_id("user2@example.com") == 2222
+        assert service.index.load()[0] > timestamp
+
+
 def test_flowdock_service_summary(default_testing_config, unit_tests_tmp_dir):
     """Test FlowdockService summary
     """
@@ -76,6 +125,53 @@ def test_flowdock_service_summary(default_testing_config, unit_tests_tmp_dir):
         service.summary(db_users_dict)
         assert exists(join(unit_tests_tmp_dir, service.output_file))
 
+        # The index is rebuilt from all users read
+        assert service.index.load()[1] == {
+            "user1@example.com": 1111, "user2@example.com": 2222, "user3@example.com": 3333}
+        assert service.user_id("user3@example.com") == 3333
+        assert mock_adapter.call_count == 1
+
+
+def test_flowdock_service_account_names(default_testing_config, unit_tests_tmp_dir):
+    """Test FlowdockService account_names looks up users without a Flowdock id by their email
+    """
+    with requests_mock.mock() as mock_adapter:
+        service = FlowdockService(default_testing_config, logger)
+        TEST_SERVER = service.server
+        TEST_ORGANISATION = service.organisation
+        if exists(service.index.filename):
+            os.remove(service.index.filename)
+
+        mock_adapter.get(DEFS.get_users(TEST_SERVER).service_url,
+            status_code=200,
+            json=[
+                {"email": "user1@example.com", "id": 1111},
+                {"email": "user2@example.com", "id": 2222},
+                {"email": "user3@example.com", "id": 3333},
+            ]
+        )
+        user_records = {
+            'user3': {'gmail': 'user3', 'status': 'active'},
+            'user2': {'gmail': 'user2', 'status': 'active', 'flowdock': 2000},
+            'user4': {'gmail': 'user4', 'status': 'active'},
+        }
+        ret = service.account_names(user_records)
+        assert ret == {'user3': 3333, 'user2': 2000}
+        assert mock_adapter.call_count == 1
+
+        # Users without a Flowdock account are not looked up again until the index expires
+        assert service.account_names({'user4': user_records['user4']}) == {}
+        assert mock_adapter.call_count == 1
+
+        # Users off boarded are removed from the index
+        for user_id in [2000, 3333]:
+            mock_adapter.delete(
+                DEFS.delete_user_from_organisation(TEST_SERVER, TEST_ORGANISATION, user_id).service_url,
+                status_code=200
+            )
+        assert service.off_board_many(list(ret.values()))[3333] is True
+        assert "user3@example.com" not in service.index.load()[1]
+
 
 def test_flowdock_service_report_inactive_users_still_have_access(default_testing_config, unit_tests_tmp_dir):
     """Test FlowdockService report_inactive_users_still_have_access
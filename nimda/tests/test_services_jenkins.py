@@ -27,6 +27,9 @@ def test_jenkins_service_off_board(default_testing_config, unit_tests_tmp_dir):
         service = JenkinsService(default_testing_config, logger)
         TEST_SERVER = service.server
 
+        # Mock get_crumb return 404 for CSRF protection disabled
+        mock_adapter.get(DEFS.get_crumb(TEST_SERVER).service_url, status_code=404)
+
         #######################################################################
         # Test 1
 
@@ -95,6 +98,7 @@ def test_jenkins_service_summary(default_testing_config, unit_tests_tmp_dir):
             }
         )
 
+        service.app.POLL_DELAY = service.app.POLL_MIN_SECONDS = 0
         service.summary(db_users_dict)
         assert exists(join(unit_tests_tmp_dir, service.output_file))
 
@@ -114,3 +118,7 @@ def test_jenkins_service_report_inactive_users_still_have_access(default_testing
     # inactive users (i.e. not active or transferred) still have jenkins access
     service = JenkinsService(default_testing_config, logger)
     assert service.report_inactive_users_still_have_access(db_users_dict) == 2
+
+    # same result from the accounts index of the database
+    accounts_index = {'jenkins': dict((v['jenkins'], [v]) for v in db_users_dict.values() if 'jenkins' in v)}
+    assert service.report_inactive_users_still_have_access(db_users_dict, accounts_index) == 2
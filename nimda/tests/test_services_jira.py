@@ -47,12 +47,12 @@ def test_jira_service_report_inactive_users_still_have_access(default_testing_co
 def test_report_users_not_in_database(default_testing_config):
     """Test JiraService report_users_not_in_database
     """
-    db_jira_users = [
-        {'gmail': 'user1', 'status': 'active', 'jira': 'user1'},
-        {'gmail': 'user2', 'status': 'suspended', 'jira': 'user2'},
-        {'gmail': 'user3', 'status': 'transferred', 'jira': 'user3'},
-        {'gmail': 'user4', 'status': 'deleted', 'jira': 'user4'},
-    ]
+    db_jira_users = {
+        'user1': [{'gmail': 'user1', 'status': 'active', 'jira': 'user1'}],
+        'user2': [{'gmail': 'user2', 'status': 'suspended', 'jira': 'user2'}],
+        'user3': [{'gmail': 'user3', 'status': 'transferred', 'jira': 'user3'}],
+        'user4': [{'gmail': 'user4', 'status': 'deleted', 'jira': 'user4'}],
+    }
     all_jira_users = {
         'user1': {},
         'user2': {},
@@ -61,3 +61,15 @@ def test_report_users_not_in_database(default_testing_config):
 
     service = JiraService(default_testing_config, logger)
     assert service.report_users_not_in_database(db_jira_users, all_jira_users) == 1
+
+
+def test_jira_service_off_board_many(default_testing_config):
+    """Test JiraService off_board_many off boards all users in one batch
+    """
+    service = JiraService(default_testing_config, logger)
+    service.app.remove_all_access_many = Mock(return_value={'user1': True, 'user2': False})
+    service.app.remove_all_access = Mock(return_value=True)
+
+    assert service.off_board_many(['user1', 'user2']) == {'user1': True, 'user2': False}
+    service.app.remove_all_access_many.assert_called_once_with(['user1', 'user2'])
+    assert service.app.remove_all_access.call_count == 0
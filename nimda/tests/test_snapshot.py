@@ -0,0 +1,46 @@
+import logging
+from decimal import Decimal
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from nimda.snapshot import Snapshot
+
+
+test_logger = logging.getLogger(__file__)
+test_logger.addHandler(logging.StreamHandler())
+
+
+def test_table_snapshot():
+    """Test Snapshot save and load
+    """
+    tmp_dir = mkdtemp(prefix='butler_')
+    snapshot = Snapshot(join(tmp_dir, 'test_snapshot.json'), test_logger)
+
+    # No snapshot yet
+    assert snapshot.load() == (None, None, None)
+
+    items = {
+        'user1': {'gmail': 'user1', 'status': 'active', 'flowdock': Decimal(1111)},
+        'user2': {'gmail': 'user2', 'status': 'suspended'},
+    }
+    snapshot.save('2017-02-10T10:49:05.000000Z', items, {'full_scan': '2017-02-09T10:49:05.000000Z'})
+
+    timestamp, ret, info = snapshot.load()
+    assert timestamp == '2017-02-10T10:49:05.000000Z'
+    assert ret == items
+    assert info == {'full_scan': '2017-02-09T10:49:05.000000Z'}
+    assert type(ret['user1']['flowdock']) is Decimal
+
+    # The snapshot is replaced, without leaving temporary files
+    snapshot.save('2017-02-11T10:49:05.000000Z', {})
+    assert snapshot.load() == ('2017-02-11T10:49:05.000000Z', {}, {})
+    assert listdir(tmp_dir) == ['test_snapshot.json']
+
+    # Invalid snapshot should be ignored
+    with open(snapshot.filename, 'w') as outfile:
+        outfile.write('{"timestamp": ')
+    assert snapshot.load() == (None, None, None)
+
+    rmtree(tmp_dir)
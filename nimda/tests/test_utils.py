@@ -1,14 +1,21 @@
 """
 Tests butler.utils
 """
+import json
 import logging
 import os
 import py.test
 
 from nimda.utils import (
+    create_http_session,
+    imap_in_thread_pool,
+    iter_json_array,
     prepare_logger,
     read_config_from_argv,
     read_multi_lines_config,
+    read_optional_config,
+    seconds_since,
+    utc_timestamp,
     write_to_json_file
 )
 
@@ -67,6 +74,14 @@ def test_read_multi_lines_config(default_testing_ini):
     assert args.transfer == 'user_to_be_transferred'
 
 
+def test_read_optional_config(default_testing_config):
+    """Test optional config falls back to the default value if not specified
+    """
+    assert read_optional_config(default_testing_config, 'dynamodb', 'dynamodb.aws_profile_name') == 'mr_aws_profile'
+    assert read_optional_config(default_testing_config, 'dynamodb', 'dynamodb.not_specified') is None
+    assert read_optional_config(default_testing_config, 'dynamodb', 'dynamodb.not_specified', 5, int) == 5
+
+
 def test_json_to_file(unit_tests_tmp_dir):
     """Test writing json data to file
     """
@@ -84,3 +99,55 @@ def test_json_to_file(unit_tests_tmp_dir):
         indent=4
     )
     assert os.path.exists(json_output_filename)
+
+
+def test_imap_in_thread_pool():
+    """Test imap_in_thread_pool returns results in order, or all results if unordered
+    """
+    assert list(imap_in_thread_pool(lambda x: x * 2, range(10), 4)) == [x * 2 for x in range(10)]
+    assert list(imap_in_thread_pool(lambda x: x * 2, range(10), 1)) == [x * 2 for x in range(10)]
+    assert sorted(imap_in_thread_pool(lambda x: x * 2, range(10), 4, ordered=False)) == [x * 2 for x in range(10)]
+
+
+def test_iter_json_array():
+    """Test iter_json_array parses elements split across chunks
+    """
+    data = json.dumps([
+        {"email": "user1@example.com", "id": 1111, "name": u"Us\u00e9r 1"},
+        12345,
+        "a string with ], and [",
+        [1, [2, 3]],
+    ], ensure_ascii=False).encode('utf-8')
+
+    for chunk_size in [1, 2, 7, len(data)]:
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        assert list(iter_json_array(chunks)) == json.loads(data.decode('utf-8'))
+
+    assert list(iter_json_array([' [ ] '])) == []
+
+    # Elements are yielded as soon as they are read
+    elements = iter_json_array(['[{"id": 1},', ' {"id"'])
+    assert next(elements) == {"id": 1}
+    with py.test.raises(ValueError):
+        next(elements)
+
+    with py.test.raises(ValueError):
+        list(iter_json_array(['{"id": 1}']))
+
+
+def test_utc_timestamp():
+    """Test utc_timestamp and seconds_since
+    """
+    timestamp = utc_timestamp()
+    assert 0 <= seconds_since(timestamp) < 60
+    assert seconds_since('2017-02-10T10:49:05.000000Z') > 0
+
+
+def test_create_http_session():
+    """Test create_http_session sets auth, headers and connection pool size
+    """
+    session = create_http_session(('user1', 'pass1'), {'content-type': 'application/json'}, pool_size=20)
+    assert session.auth == ('user1', 'pass1')
+    assert session.headers['content-type'] == 'application/json'
+    adapter = session.get_adapter('https://example.com')
+    assert adapter._pool_connections == 20 and adapter._pool_maxsize == 20
@@ -1,14 +1,26 @@
 from __future__ import print_function
 import argparse
+import codecs
+from datetime import datetime
 from decimal import Decimal
 import json
 import logging
 from logging.handlers import RotatingFileHandler
+from multiprocessing.pool import ThreadPool
 import os
 import re
+import requests
+from requests.adapters import HTTPAdapter
+import six
 from six.moves import configparser
 
 
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# Default max number of connections kept alive per host by a http session
+DEFAULT_POOL_SIZE = 10
+
+
 def prepare_logger(app_name, log_file=None, log_level=logging.DEBUG):
     """Prepare logger for the given app name
     """
@@ -36,10 +48,10 @@ def read_config_from_argv(argv):
     parser = argparse.ArgumentParser(description='Butler-Alpha')
     parser.add_argument('-c', '--config', metavar='CONFIG_INI',
                         help='config.ini file', required=True)
-    parser.add_argument('-o', '--offboard', metavar='USER_NAME', default=None,
-                        help='User to be off-boarded for all services')
-    parser.add_argument('-t', '--transfer', metavar='USER_NAME', default=None,
-                        help='User (transferring to other business group) to be off-boarded for a sub set of the services')
+    parser.add_argument('-o', '--offboard', metavar='USER_NAME[,USER_NAME...]', default=None,
+                        help='User(s) to be off-boarded for all services')
+    parser.add_argument('-t', '--transfer', metavar='USER_NAME[,USER_NAME...]', default=None,
+                        help='User(s) (transferring to other business group) to be off-boarded for a sub set of the services')
     args = parser.parse_args(argv)
 
     # read from config
@@ -67,6 +79,100 @@ def read_multi_lines_config(config, section_name, param_name, logger):
     return []
 
 
+def read_optional_config(config, section_name, param_name, default=None, value_type=str):
+    """Return value (converted to `value_type`) of an optional config, or `default` if not specified
+    """
+    if not config.has_option(section_name, param_name):
+        return default
+    if value_type is bool:
+        return config.getboolean(section_name, param_name)
+    return value_type(config.get(section_name, param_name))
+
+
+def imap_in_thread_pool(func, iterable, max_workers, ordered=True):
+    """Yield `func(item)` for each item in `iterable`, computed by a pool of at most `max_workers` threads.
+       Results are yielded in the order of `iterable` if `ordered`; otherwise as soon as they complete.
+    """
+    if max_workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    pool = ThreadPool(max_workers)
+    try:
+        results = pool.imap(func, iterable) if ordered else pool.imap_unordered(func, iterable)
+        for ret in results:
+            yield ret
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def create_http_session(auth, headers=None, pool_size=DEFAULT_POOL_SIZE):
+    """Return a `requests.Session` with `auth` and `headers` set, which keeps up to `pool_size`
+       connections per host alive for reuse across requests
+    """
+    session = requests.Session()
+    session.auth = auth
+    if headers is not None:
+        session.headers.update(headers)
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def iter_json_array(chunks):
+    """Yield each element of a JSON array read from `chunks` (an iterable of bytes or text, e.g.
+       `response.iter_content()`), parsed as the chunks are read without holding the whole array in memory
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    started = False
+    for chunk in chunks:
+        if six.PY3 and isinstance(chunk, bytes):
+            chunk = utf8_decoder.decode(chunk)
+        buf += chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("Expecting JSON array at: {}".format(buf[pos:pos + 20]))
+                started = True
+                pos += 1
+            elif buf[pos] == ',':
+                pos += 1
+            elif buf[pos] == ']':
+                return
+            else:
+                try:
+                    element, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Element not read completely yet
+                    break
+                if end == len(buf):
+                    # E.g. a number may continue in the next chunk
+                    break
+                yield element
+                pos = end
+        buf = buf[pos:]
+    raise ValueError("Unterminated JSON array")
+
+
+def decimal_to_number(obj):
+    """JSON encoder of `Decimal` (the type of numbers read from DynamoDB) as a number
+    """
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError
+
+
 def write_to_json_file(data, filename, indent=2):
     """Write given json data to file with indent
     """
@@ -77,3 +183,15 @@ def write_to_json_file(data, filename, indent=2):
 
     with open(filename, "w") as outfile:
         json.dump(data, outfile, sort_keys=True, indent=indent, default=default_encoder)
+
+
+def utc_timestamp():
+    """Return current UTC time as an ISO 8601 string, which sorts in time order
+    """
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+
+def seconds_since(timestamp):
+    """Return number of seconds elapsed since the given `utc_timestamp()` string
+    """
+    return (datetime.utcnow() - datetime.strptime(timestamp, TIMESTAMP_FORMAT)).total_seconds()